@@ -20,13 +20,12 @@ INSTALLED_APPS = [
     'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
     'katloapp',
-    'cloudinary_storage', 
-    'cloudinary',         
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'katloapp.middleware.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -63,6 +62,46 @@ DATABASES = {
     }
 }
 
+# Optional read replica for public pages. Locally this is a second SQLite
+# file refreshed from the primary by `manage.py replicate_db`.
+DATABASE_REPLICA_NAME = os.environ.get('DATABASE_REPLICA_NAME')
+if DATABASE_REPLICA_NAME:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_REPLICA_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['katloapp.routers.PrimaryReplicaRouter']
+# After a write, the visitor reads from the primary for this long.
+REPLICA_STICKY_SECONDS = 15
+
+# Without REDIS_URL (which needs the redis package) the cache is per
+# process: each worker has its own.
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# With a shared cache, sessions are read from it and only hit the database
+# on a miss or a write. A per-process cache cannot hold them: a logout
+# would only clear the worker that handled it, and the others would keep
+# accepting the session until their copy expired.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE') or (
+    'django.contrib.sessions.backends.cached_db' if REDIS_URL
+    else 'django.contrib.sessions.backends.db'
+)
+
+# Loads request.user together with their business in one query. It must be
+# the only backend that authenticates: a failed login runs the password
+# hasher once per backend. Sessions record their backend's path, so ones
+# created under the default ModelBackend end and those users log in again.
+AUTHENTICATION_BACKENDS = ['katloapp.backends.BusinessModelBackend']
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -82,10 +121,66 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 CLOUDINARY_URL = os.environ.get('CLOUDINARY_URL')
 MEDIA_URL = '/media/'
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+MEDIA_ROOT = BASE_DIR / 'media'
+DEFAULT_FILE_STORAGE = 'katloapp.storage.MediaStorage'
+
+# Backend behind MediaStorage: Cloudinary when configured, otherwise local
+# disk with Cloudinary-style URLs so uploads and load tests work offline.
+MEDIA_STORAGE_BACKEND = os.environ.get('MEDIA_STORAGE_BACKEND') or (
+    'cloudinary_storage.storage.MediaCloudinaryStorage' if CLOUDINARY_URL
+    else 'katloapp.storage.LocalMediaStorage'
+)
+# The Cloudinary apps are only loaded when their storage is in use.
+if MEDIA_STORAGE_BACKEND.startswith('cloudinary_storage.'):
+    INSTALLED_APPS += ['cloudinary_storage', 'cloudinary']
+
+# Stage uploads on disk and write them to the backend from a worker thread.
+# Only the worker that took the upload can serve it until the write lands,
+# so leave this off unless requests for new images can tolerate a 404.
+MEDIA_STORAGE_BACKGROUND_WRITES = os.environ.get('MEDIA_STORAGE_BACKGROUND_WRITES', '') == 'True'
+MEDIA_STORAGE_WRITE_RETRIES = 5
+MEDIA_STORAGE_SLOW_MS = 500
+BACKGROUND_TASK_WORKERS = 2
+
+# Uploads above this size stream to a temporary file instead of memory.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 512 * 1024
+
+# Hash uploads while they stream in so product images can be deduplicated.
+FILE_UPLOAD_HANDLERS = [
+    'katloapp.uploadhandlers.HashingMemoryFileUploadHandler',
+    'katloapp.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Bearer tokens that partner mirrors use to read the catalog change feed.
+CHANGE_FEED_TOKENS = [t for t in os.environ.get('CHANGE_FEED_TOKENS', '').split(',') if t]
+
+# Catalogue import (katloapp.scraper)
+SCRAPER_WORKERS = 4
+SCRAPER_TIMEOUT = 15
+SCRAPER_RATE_LIMIT_SECONDS = 1.0  # minimum gap between requests to one host
+SCRAPER_USER_AGENT = 'KatloCatalogueImporter/1.0'
+
+# Public catalog pages are cached minified and compressed for anonymous
+# visitors (katloapp.pagecache); entries are keyed by catalog version, so
+# this only bounds how long unused ones linger.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Token-bucket limits per view, keyed by client IP ('ip'), submitted
+# username ('username'), both together ('ip_username') or logged-in user
+# ('user'): 'N/period' allows bursts of N refilled over the period.
+RATE_LIMITS = {
+    'login': {'ip': '20/m', 'ip_username': '5/m'},
+    'register': {'ip': '10/h'},
+    'download_qr': {'user': '10/m', 'ip': '30/m'},
+}
+# Cache alias holding the buckets; unset keeps them per process. Point it
+# at a shared cache (Redis, Memcached) to limit across all workers.
+RATE_LIMIT_CACHE = os.environ.get('RATE_LIMIT_CACHE') or None
+# Proxies in front of the app that append to X-Forwarded-For.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', '0'))
+
 LOGIN_URL = '/business/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
\ No newline at end of file
@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.contrib.auth.views import LogoutView
 from django.conf import settings
 from django.conf.urls.static import static
+from katloapp import views as katlo_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,4 +13,8 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
+    urlpatterns += [
+        path(f"{settings.MEDIA_URL.strip('/')}/_t/<str:transformation>/<path:path>",
+             katlo_views.media_transform, name='media_transform'),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
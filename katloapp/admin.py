@@ -1,14 +1,117 @@
 from django.contrib import admin
-from .models import Business, Product
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import Business, Product, ScrapeLog, WhatsAppCatalogue
+
+# Unfiltered changelists over tables at least this big show the planner's
+# row estimate instead of running COUNT(*).
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+def estimated_row_count(model, using):
+    """The database's own row estimate for model's table, or None if it has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            except DatabaseError:
+                # sqlite_stat1 only exists once ANALYZE (or PRAGMA optimize) has run.
+                return None
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables too big to count or scan on every page
+    view. Subclasses implement get_search_results over indexed columns.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Newest first by primary key, which needs no extra index or sort.
+    ordering = ('-pk',)
 
 @admin.register(Business)
-class BusinessAdmin(admin.ModelAdmin):
+class BusinessAdmin(LargeTableAdmin):
     list_display = ('name','user','whatsapp_number','slug','public','created_at')
-    search_fields = ('name','user__username','whatsapp_number','slug')
+    list_select_related = ('user',)
+    # Name prefix, or exact WhatsApp number, slug or owner username.
+    search_fields = ('^name','=whatsapp_number','=slug','=user__username')
     list_filter = ('public','city')
 
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        users = get_user_model().objects.filter(username=term).values('pk')
+        # Every branch is on an indexed Business column, so SQLite can
+        # answer the OR with one index lookup per branch.
+        return queryset.filter(
+            Q(name__istartswith=term) | Q(whatsapp_number=term) | Q(slug=term) | Q(user__in=users)
+        ), False
+
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ('name','business','price','active','created_at')
-    search_fields = ('name','business__name','sku')
+    list_select_related = ('business',)
+    # Name prefix, exact SKU, or the name prefix of the business.
+    search_fields = ('^name','=sku','^business__name')
     list_filter = ('active',)
+    autocomplete_fields = ('business',)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        # Resolve businesses first rather than joining, which would turn
+        # the OR into a scan of every product.
+        businesses = Business.objects.filter(name__istartswith=term).values('pk')
+        return queryset.filter(
+            Q(name__istartswith=term) | Q(sku__iexact=term) | Q(business__in=businesses)
+        ), False
+
+@admin.register(WhatsAppCatalogue)
+class WhatsAppCatalogueAdmin(admin.ModelAdmin):
+    list_display = ('name','business','url','active','last_scraped_at')
+    list_select_related = ('business',)
+    search_fields = ('name','url','business__name')
+    list_filter = ('active',)
+    autocomplete_fields = ('business',)
+    actions = ['scrape_now']
+
+    @admin.action(description='Scrape selected catalogues now')
+    def scrape_now(self, request, queryset):
+        from .scraper import WhatsAppCatalogueScraper
+        logs = WhatsAppCatalogueScraper().scrape(queryset.select_related('business'))
+        ok = sum(log.status != ScrapeLog.STATUS_FAILED for log in logs)
+        self.message_user(request, f'Scraped {ok} of {len(logs)} catalogues.')
+
+@admin.register(ScrapeLog)
+class ScrapeLogAdmin(admin.ModelAdmin):
+    list_display = ('catalogue','status','products_found','products_added','products_updated','started_at')
+    list_select_related = ('catalogue',)
+    list_filter = ('status',)
+    autocomplete_fields = ('catalogue',)
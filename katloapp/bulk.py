@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Round
+
+from .models import ImageBlob
+from .signals import bulk_products, products_bulk_changed
+
+BULK_ACTIONS = (
+    ('activate', 'Activate'),
+    ('deactivate', 'Deactivate'),
+    ('price', 'Adjust price by %'),
+    ('delete', 'Delete'),
+)
+
+
+def apply_bulk_action(business, products, action, percent=None):
+    """
+    Apply one action to every product in the queryset with a single
+    UPDATE or DELETE, and notify listeners once for the whole batch.
+
+    Returns the number of products affected.
+    """
+    with transaction.atomic():
+        product_ids = list(products.values_list('pk', flat=True))
+        if action == 'activate':
+            count = products.update(active=True)
+        elif action == 'deactivate':
+            count = products.update(active=False)
+        elif action == 'price':
+            factor = 1 + Decimal(percent) / 100
+            count = products.update(price=Round(F('price') * factor, 2))
+        elif action == 'delete':
+            count = _delete_products(products)
+        else:
+            raise ValueError(f'Unknown bulk action: {action}')
+
+        products_bulk_changed.send(sender=business.__class__, business=business,
+                                   action=action, count=count, product_ids=product_ids)
+    return count
+
+
+def _delete_products(products):
+    # Release shared images per blob rather than per row; the per-row
+    # handlers are skipped, and the facets and change log are updated once
+    # from products_bulk_changed.
+    blob_refs = (products.exclude(image_blob=None).order_by()
+                 .values_list('image_blob').annotate(refs=Count('pk')))
+    for blob_id, refs in blob_refs:
+        ImageBlob.release(blob_id, refs)
+    with bulk_products():
+        count, _ = products.delete()
+    return count
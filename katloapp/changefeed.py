@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Business, ChangeLogCompaction, ChangeLogEntry, Product
+
+BATCH_SIZE = 500
+
+
+def serialize_business(business):
+    return {
+        'id': business.pk,
+        'slug': business.slug,
+        'name': business.name,
+        'description': business.description,
+        'whatsapp_number': business.whatsapp_number,
+        'city': business.city,
+        'native_place': business.native_place,
+        'public': business.public,
+        'created_at': business.created_at.isoformat(),
+    }
+
+
+def serialize_product(product):
+    return {
+        'id': product.pk,
+        'business_id': product.business_id,
+        'name': product.name,
+        'price': str(product.price) if product.price is not None else None,
+        'description': product.description,
+        'image': product.image.url if product.image else None,
+        'sku': product.sku,
+        'active': product.active,
+        'created_at': product.created_at.isoformat(),
+    }
+
+
+SERIALIZERS = {'business': serialize_business, 'product': serialize_product}
+
+
+def published(instance):
+    """Whether a Business/Product is in a public catalog and may be mirrored."""
+    business = instance if isinstance(instance, Business) else instance.business
+    return business.public
+
+
+def record(instance, action):
+    """
+    Append one entry for a saved or deleted Business/Product. Anything in
+    a private catalog is logged as deleted, so mirrors drop it if they had
+    it and never receive its data.
+    """
+    object_type = instance._meta.model_name
+    if action == ChangeLogEntry.ACTION_UPSERT and not published(instance):
+        action = ChangeLogEntry.ACTION_DELETE
+    data = SERIALIZERS[object_type](instance) if action == ChangeLogEntry.ACTION_UPSERT else None
+    business_id = instance.pk if object_type == 'business' else instance.business_id
+    ChangeLogEntry.objects.create(object_type=object_type, object_id=instance.pk,
+                                  business_id=business_id, action=action, data=data)
+
+
+def _product_entry(product):
+    if not published(product):
+        return ChangeLogEntry(object_type='product', object_id=product.pk,
+                              business_id=product.business_id, action=ChangeLogEntry.ACTION_DELETE)
+    return ChangeLogEntry(object_type='product', object_id=product.pk, business_id=product.business_id,
+                          action=ChangeLogEntry.ACTION_UPSERT, data=serialize_product(product))
+
+
+def record_products(business_id, product_ids, action):
+    """Append entries for a batch of one business's products touched by one bulk operation."""
+    if action == ChangeLogEntry.ACTION_DELETE:
+        entries = [ChangeLogEntry(object_type='product', object_id=pk, business_id=business_id,
+                                  action=action)
+                   for pk in product_ids]
+    else:
+        entries = [_product_entry(product)
+                   for product in (Product.objects.filter(pk__in=product_ids)
+                                   .select_related('business').order_by('pk'))]
+    ChangeLogEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def resync_floor():
+    """Cursors below this seq may have missed purged tombstones."""
+    return ChangeLogCompaction.objects.aggregate(n=Max('purged_through'))['n'] or 0
+
+
+def catalog_version():
+    """
+    A number that changes with every logged catalog write, including
+    writes whose entries were since compacted away.
+    """
+    head = ChangeLogEntry.objects.aggregate(n=Max('seq'))['n'] or 0
+    return max(head, resync_floor())
+
+
+def business_version(slug):
+    """
+    Like catalog_version(), for the catalog of the business with this slug
+    alone; None if there is no such business.
+    """
+    business_id = Business.objects.filter(slug=slug).values('pk')
+    head = (ChangeLogEntry.objects.filter(business_id=Subquery(business_id))
+            .aggregate(n=Max('seq'))['n'])
+    # A purged tombstone may have been the head; the floor moves past it.
+    return None if head is None else f'{head}.{resync_floor()}'
+
+
+def entries_since(since, limit):
+    """Yield up to limit entries after since, fetched in seq-ordered batches."""
+    sent = 0
+    while sent < limit:
+        batch = list(ChangeLogEntry.objects.filter(seq__gt=since)
+                     .order_by('seq')[:min(BATCH_SIZE, limit - sent)])
+        if not batch:
+            return
+        yield from batch
+        sent += len(batch)
+        since = batch[-1].seq
+
+
+def compact(tombstone_days=30):
+    """
+    Delete entries superseded by a later entry for the same object, then
+    tombstones older than tombstone_days. Returns (superseded, purged).
+    """
+    latest = (ChangeLogEntry.objects.filter(object_type=OuterRef('object_type'),
+                                            object_id=OuterRef('object_id'))
+              .order_by('-seq').values('seq')[:1])
+    with transaction.atomic():
+        superseded, _ = (ChangeLogEntry.objects.exclude(seq=Subquery(latest)).delete())
+        cutoff = timezone.now() - timedelta(days=tombstone_days)
+        tombstones = ChangeLogEntry.objects.filter(action=ChangeLogEntry.ACTION_DELETE,
+                                                   created_at__lt=cutoff)
+        purged_through = tombstones.aggregate(n=Max('seq'))['n']
+        purged = 0
+        if purged_through is not None:
+            purged, _ = tombstones.delete()
+            ChangeLogCompaction.objects.create(purged_through=purged_through)
+    return superseded, purged
+
@@ -1,9 +1,9 @@
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
-import requests
+from django.views.decorators.http import require_POST
 from .models import WhatsAppCatalogue
-from .scraper import WhatsAppCatalogueScraper
+from .scraper import WhatsAppCatalogueScraper, parse_page
 import logging
 
 logger = logging.getLogger(__name__)
@@ -54,17 +54,14 @@ def debug_catalogue_url(request, catalogue_id):
                 debug_info['content_type'] = response.headers.get('content-type', 'unknown')
                 
                 # Extract basic page info
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(response.text, 'html.parser')
+                page = parse_page(response.text)
                 
                 # Get page title
-                title_tag = soup.find('title')
-                if title_tag:
-                    debug_info['page_title'] = title_tag.get_text().strip()
+                if page.title:
+                    debug_info['page_title'] = page.title
                 
                 # Check for structured data
-                json_scripts = soup.find_all('script', type='application/ld+json')
-                debug_info['has_structured_data'] = len(json_scripts) > 0
+                debug_info['has_structured_data'] = len(page.json_ld) > 0
                 
                 # Look for product indicators
                 product_indicators = []
@@ -76,17 +73,11 @@ def debug_catalogue_url(request, catalogue_id):
                 if price_matches:
                     product_indicators.append(f"Found {len(price_matches)} price patterns")
                 
-                # Check for common product selectors
-                product_selectors = [
-                    '.product', '.product-item', '.product-card',
-                    '[data-product]', '.catalogue-item',
-                    'h3', 'h2'  # Potential product titles
-                ]
-                
-                for selector in product_selectors:
-                    elements = soup.select(selector)
-                    if elements:
-                        product_indicators.append(f"Found {len(elements)} elements with selector '{selector}'")
+                # Check for common product markup
+                if page.product_elements:
+                    product_indicators.append(f"Found {page.product_elements} product elements")
+                if page.headings:
+                    product_indicators.append(f"Found {page.headings} h2/h3 headings (potential product titles)")
                 
                 debug_info['product_indicators'] = product_indicators
                 
@@ -129,10 +120,12 @@ def debug_catalogue_url(request, catalogue_id):
     
     return JsonResponse(debug_info, json_dumps_params={'indent': 2})
 
-@staff_member_required 
+@staff_member_required
+@require_POST
 def test_sample_data(request, catalogue_id):
     """
-    Test endpoint to create sample data for a catalogue
+    Test endpoint to create sample data for a catalogue. It writes
+    products into the live catalog, so it only answers POST.
     """
     try:
         from .scraper import scrape_whatsapp_catalogue
@@ -0,0 +1,43 @@
+from functools import wraps
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect
+
+from .models import Business
+
+
+def get_request_business(request, create=False):
+    """
+    The logged-in user's business, or None if they have none yet.
+
+    The business is cached on request.user for the rest of the request;
+    with create=True a missing business is created first.
+    """
+    try:
+        return request.user.business
+    except Business.DoesNotExist:
+        if not create:
+            return None
+    business = Business.objects.create(
+        user=request.user,
+        name=request.user.get_full_name() or f"{request.user.username}'s Business"
+    )
+    request.user.business = business
+    return business
+
+
+def business_required(view_func):
+    """
+    login_required that also passes the user's business to the view,
+    sending users without one to the business profile form.
+    """
+    @login_required
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        business = get_request_business(request)
+        if business is None:
+            messages.error(request, 'Please complete your business profile first.')
+            return redirect('katloapp:business_edit')
+        return view_func(request, business, *args, **kwargs)
+    return wrapper
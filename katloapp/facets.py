@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+
+from .models import DISCOVERABLE, Business, CatalogFacet, Product
+
+# (slug, label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = (
+    ('under-500', 'Under ₹500', None, Decimal('500')),
+    ('500-2000', '₹500 – ₹2,000', Decimal('500'), Decimal('2000')),
+    ('2000-10000', '₹2,000 – ₹10,000', Decimal('2000'), Decimal('10000')),
+    ('10000-plus', '₹10,000 and above', Decimal('10000'), None),
+    ('no-price', 'Price on request', None, None),
+)
+PRICE_BUCKET_LABELS = {slug: label for slug, label, _, _ in PRICE_BUCKETS}
+FACET_FIELDS = ('city', 'native_place', 'price_bucket')
+
+
+def price_bucket(price):
+    """Bucket slug for a product price."""
+    if price is None:
+        return 'no-price'
+    for slug, _, low, high in PRICE_BUCKETS[:-1]:
+        if (low is None or price >= low) and (high is None or price < high):
+            return slug
+    return 'no-price'
+
+
+def price_bucket_q(slug):
+    """Q object selecting products whose price falls in the bucket."""
+    for bucket, _, low, high in PRICE_BUCKETS:
+        if bucket != slug:
+            continue
+        if bucket == 'no-price':
+            return Q(price__isnull=True)
+        q = Q()
+        if low is not None:
+            q &= Q(price__gte=low)
+        if high is not None:
+            q &= Q(price__lt=high)
+        return q
+    raise ValueError(f'Unknown price bucket: {slug}')
+
+
+def price_bucket_case():
+    """Database expression equivalent to price_bucket(price)."""
+    return Case(*[When(price_bucket_q(slug), then=Value(slug)) for slug, _, _, _ in PRICE_BUCKETS[:-1]],
+                default=Value('no-price'))
+
+
+def adjust(business_id, bucket, delta):
+    """Add delta to one business/bucket count, creating the row if needed."""
+    rows = CatalogFacet.objects.filter(business_id=business_id, price_bucket=bucket)
+    if rows.update(product_count=F('product_count') + delta) or delta < 0:
+        return
+    business = Business.objects.filter(pk=business_id).values('city', 'native_place', 'public').first()
+    if business is None:
+        return
+    try:
+        with transaction.atomic():
+            CatalogFacet.objects.create(business_id=business_id, price_bucket=bucket,
+                                        product_count=delta, **business)
+    except IntegrityError:
+        rows.update(product_count=F('product_count') + delta)
+
+
+def sync_business_fields(business):
+    """Copy a business's facet fields onto its facet rows and products."""
+    fields = {'city': business.city, 'native_place': business.native_place, 'public': business.public}
+    CatalogFacet.objects.filter(business=business).update(**fields)
+    Product.objects.filter(business=business).exclude(**fields).update(**fields)
+
+
+def sync_price_buckets(product_ids):
+    """Recompute the stored price bucket of products repriced in bulk."""
+    Product.objects.filter(pk__in=product_ids).update(price_bucket=price_bucket_case())
+
+
+def rebuild_business(business):
+    """Recount one business's facet rows from its products."""
+    counts = {}
+    for price, n in (business.products.filter(active=True).order_by()
+                     .values_list('price').annotate(n=Count('pk'))):
+        bucket = price_bucket(price)
+        counts[bucket] = counts.get(bucket, 0) + n
+    with transaction.atomic():
+        CatalogFacet.objects.filter(business=business).delete()
+        CatalogFacet.objects.bulk_create([
+            CatalogFacet(business=business, price_bucket=bucket, product_count=n,
+                         city=business.city, native_place=business.native_place,
+                         public=business.public)
+            for bucket, n in counts.items()
+        ])
+
+
+def rebuild_all():
+    for business in Business.objects.all().iterator():
+        rebuild_business(business)
+
+
+def facet_counts(filters):
+    """
+    Facet counts for public catalogs under the given filters.
+
+    filters maps facet field names to selected values. Each facet's counts
+    apply every filter except its own, so sibling values stay selectable.
+    Returns (total, {field: [(value, count), ...]}).
+    """
+    base = CatalogFacet.objects.filter(public=True, product_count__gt=0)
+    facets = {}
+    for field in FACET_FIELDS:
+        others = {k: v for k, v in filters.items() if k != field and v}
+        rows = (base.filter(**others).exclude(**{field: ''}).order_by()
+                .values_list(field).annotate(n=Sum('product_count')).order_by('-n', field))
+        facets[field] = list(rows)
+    # The price facet already applies every other filter, so the total is
+    # either its sum or the count of the selected bucket.
+    selected = filters.get('price_bucket')
+    total = sum(n for bucket, n in facets['price_bucket'] if not selected or bucket == selected)
+    return total, facets
+
+
+def discover_products(filters):
+    """Active products in public catalogs matching the facet filters."""
+    products = Product.objects.filter(DISCOVERABLE)
+    for field in FACET_FIELDS:
+        if filters.get(field):
+            products = products.filter(**{field: filters[field]})
+    return products
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(product):
+    """Keyset cursor for a product: its created_at in microseconds and pk."""
+    return f'{(product.created_at - _EPOCH) // timedelta(microseconds=1)}-{product.pk}'
+
+
+def decode_cursor(cursor):
+    """(created_at, pk) from encode_cursor(); raises ValueError if malformed."""
+    stamp, _, pk = cursor.partition('-')
+    return _EPOCH + timedelta(microseconds=int(stamp)), int(pk)
+
+
+def discover_page(filters, after=None, before=None, size=24):
+    """
+    One page of discover_products(), newest first, keyed on (created_at,
+    pk) rather than an offset so every page costs the same: the page after
+    the cursor after, the one before the cursor before, or the first.
+
+    Returns (products, has_previous, has_next).
+    """
+    products = discover_products(filters).select_related('business')
+    if before:
+        created_at, pk = decode_cursor(before)
+        rows = list(products.filter(created_at__gte=created_at)
+                    .exclude(created_at=created_at, pk__lte=pk)
+                    .order_by('created_at', 'pk')[:size + 1])
+        return rows[:size][::-1], len(rows) > size, True
+    if after:
+        created_at, pk = decode_cursor(after)
+        products = (products.filter(created_at__lte=created_at)
+                    .exclude(created_at=created_at, pk__gte=pk))
+    rows = list(products.order_by('-created_at', '-pk')[:size + 1])
+    return rows[:size], bool(after), len(rows) > size
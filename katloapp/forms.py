@@ -1,6 +1,9 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.core.validators import RegexValidator
+from .bulk import BULK_ACTIONS
 from .models import Business, Product
+from .utils import MAX_IMAGE_BYTES, file_sha256, sniff_image
 
 class BusinessForm(forms.ModelForm):
     class Meta:
@@ -71,6 +74,9 @@ class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
         fields = ['name', 'price', 'description', 'image', 'sku', 'active']
+        # Plain FileField: clean_image sniffs the header itself instead of
+        # letting forms.ImageField run a full Pillow verify() first.
+        field_classes = {'image': forms.FileField}
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-blue-500 focus:border-blue-500',
@@ -125,13 +131,29 @@ class ProductForm(forms.ModelForm):
     
     def clean_image(self):
         image = self.cleaned_data.get('image')
-        if image:
+        if image and isinstance(image, UploadedFile):
             # Check file size (limit to 5MB)
-            if image.size > 5 * 1024 * 1024:
+            if image.size > MAX_IMAGE_BYTES:
                 raise forms.ValidationError('Image file too large. Maximum size is 5MB.')
             
-            # Check if it's actually an image
-            if not image.content_type.startswith('image/'):
-                raise forms.ValidationError('Please upload a valid image file.')
+            # Check the header is a supported image within the pixel limit
+            try:
+                image.image_format, image.width, image.height = sniff_image(image)
+            except ValueError as e:
+                raise forms.ValidationError(str(e))
+            file_sha256(image)
         
-        return image
\ No newline at end of file
+        return image
+
+
+class BulkProductActionForm(forms.Form):
+    action = forms.ChoiceField(choices=BULK_ACTIONS)
+    percent = forms.DecimalField(required=False, max_digits=6, decimal_places=2,
+                                 min_value=-99, max_value=1000)
+    select_all = forms.BooleanField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == 'price' and cleaned_data.get('percent') is None:
+            raise forms.ValidationError('Enter the percentage to change prices by.')
+        return cleaned_data
\ No newline at end of file
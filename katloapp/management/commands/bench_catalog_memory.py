@@ -0,0 +1,68 @@
+import tracemalloc
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+from katloapp.models import Business, Product
+from katloapp.views import catalog_rows
+
+DESCRIPTION = 'Hand-finished in small batches from locally sourced materials. ' * 12
+
+
+def peak_memory(func):
+    """Run func and return (result, peak bytes allocated while it ran)."""
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = 'Measures peak memory of rendering a public catalog with tracemalloc'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        # Lets the test client through ALLOWED_HOSTS.
+        setup_test_environment()
+        count = options['products']
+        # Everything created here is rolled back at the end.
+        with transaction.atomic():
+            business = Business.objects.create(name='Memory benchmark', whatsapp_number='+910000000000')
+            Product.objects.bulk_create(
+                (Product(business=business, name=f'Product {i}', price=Decimal(100 + i % 900),
+                         description=DESCRIPTION, sku=f'BENCH-{i}') for i in range(count)),
+                batch_size=500,
+            )
+            catalog_url = f'http://testserver{business.get_public_url()}'
+            url = business.get_public_url()
+
+            _, instances = peak_memory(lambda: list(business.products.filter(active=True)))
+            _, rows = peak_memory(lambda: list(catalog_rows(business, catalog_url)))
+            self.stdout.write(f"{count} products held as:")
+            self.stdout.write(f"  model instances  {instances / 2**20:7.1f}MB ({instances / count:,.0f} B/product)")
+            self.stdout.write(f"  catalog rows     {rows / 2**20:7.1f}MB ({rows / count:,.0f} B/product, "
+                              f"WhatsApp links included)")
+
+            visitor, merchant = Client(HTTP_ACCEPT_ENCODING='gzip, br'), Client()
+            merchant.force_login(get_user_model().objects.create_user('memory-benchmark'))
+            visitor.get(url)  # load templates and compressors outside the measurements
+            business.save()  # a new catalog version, so the next visit renders afresh
+            self.stdout.write('Peak memory per request:')
+            for label, client in (('first visit', visitor), ('cached visit', visitor), ('signed in', merchant)):
+                # Reading the body inside the measurement consumes a streamed response.
+                (size, encoding), peak = peak_memory(lambda: self._fetch(client, url))
+                self.stdout.write(f"  {label:<13} {peak / 2**20:7.1f}MB, {size / 1024:,.0f}KB sent ({encoding})")
+            transaction.set_rollback(True)
+
+    def _fetch(self, client, url):
+        response = client.get(url)
+        size = sum(len(chunk) for chunk in response) if response.streaming else len(response.content)
+        return size, response.get('Content-Encoding', 'identity')
@@ -0,0 +1,59 @@
+import logging
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from katloapp.ratelimit import get_store
+
+ATTACKER_IP = '203.0.113.7'
+VISITOR_IP = '198.51.100.20'
+
+
+class Command(BaseCommand):
+    help = 'Simulates a login credential-stuffing burst with and without rate limiting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=60)
+        parser.add_argument('--usernames', type=int, default=10, help='Distinct usernames tried.')
+        parser.add_argument('--probe-every', type=int, default=5,
+                            help='Time a visitor page load after this many attempts.')
+
+    def handle(self, *args, **options):
+        # Lets the test client through ALLOWED_HOSTS.
+        setup_test_environment()
+        logging.getLogger('katloapp.ratelimit').setLevel(logging.ERROR)
+        with override_settings(RATE_LIMITS={}):
+            self._run('unlimited', options)
+        self._run('rate limited', options)
+
+    def _run(self, label, options):
+        get_store().clear()
+        attacker, visitor = Client(REMOTE_ADDR=ATTACKER_IP), Client(REMOTE_ADDR=VISITOR_IP)
+        login_url, home_url = reverse('katloapp:business_login'), reverse('katloapp:public_home')
+        hashed, rejected, probes = [], [], []
+
+        start, cpu_start = time.perf_counter(), time.process_time()
+        for i in range(options['attempts']):
+            attempt_start = time.perf_counter()
+            response = attacker.post(login_url, {'username': f"user{i % options['usernames']}",
+                                                 'password': 'hunter2'})
+            # A rejected attempt is redirected; one that reached authenticate re-renders the form.
+            outcome = rejected if response.status_code == 302 else hashed
+            outcome.append((time.perf_counter() - attempt_start) * 1000)
+            if i % options['probe_every'] == 0:
+                probe_start = time.perf_counter()
+                visitor.get(home_url)
+                probes.append((time.perf_counter() - probe_start) * 1000)
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+
+        self.stdout.write(f"{label}: {options['attempts']} attempts in {elapsed:.2f}s "
+                          f"({options['attempts'] / elapsed:.1f}/s), {cpu:.2f}s CPU")
+        for name, timings in (('hashed', hashed), ('rejected', rejected)):
+            if timings:
+                self.stdout.write(f"  {name:<8} n={len(timings):<4} median {statistics.median(timings):.2f}ms")
+        self.stdout.write(f"  visitor page: median {statistics.median(probes):.1f}ms, "
+                          f"max {max(probes):.1f}ms over {len(probes)} loads")
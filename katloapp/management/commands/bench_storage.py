@@ -0,0 +1,43 @@
+import io
+import time
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from katloapp.storage import MediaStorage, metrics
+from katloapp.tasks import wait_for_background_tasks
+
+
+class Command(BaseCommand):
+    help = 'Measures media storage write/read/delete latency with generated images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100)
+        parser.add_argument('--size', type=int, default=256, help='Image edge length in pixels.')
+        parser.add_argument('--background', action='store_true', help='Use background writes.')
+
+    def handle(self, *args, **options):
+        from PIL import Image
+
+        storage = MediaStorage(background_writes=options['background'])
+        buf = io.BytesIO()
+        Image.new('RGB', (options['size'], options['size']), 'teal').save(buf, format='JPEG')
+        payload = buf.getvalue()
+
+        metrics.reset()
+        names = []
+        start = time.perf_counter()
+        for i in range(options['count']):
+            names.append(storage.save(f'bench/{i}.jpg', ContentFile(payload)))
+        request_time = time.perf_counter() - start
+        wait_for_background_tasks()
+        for name in names:
+            with storage.open(name) as fh:
+                fh.read()
+            storage.delete(name)
+
+        self.stdout.write(f"{options['count']} saves returned in {request_time * 1000:.1f}ms "
+                          f"using {storage.backend_path}")
+        for op, stats in sorted(metrics.snapshot().items()):
+            self.stdout.write(f"  {op:<7} n={stats['count']:<5} avg={stats['avg_ms']:.2f}ms "
+                              f"max={stats['max_ms']:.2f}ms")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from katloapp.changefeed import compact
+
+
+class Command(BaseCommand):
+    help = 'Compacts the catalog change log for partner mirrors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tombstone-days', type=int, default=30,
+                            help='Keep delete entries for this many days.')
+
+    def handle(self, *args, **options):
+        superseded, purged = compact(options['tombstone_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {superseded} superseded entries and {purged} expired tombstones.'))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from katloapp.models import ImageBlob
+
+
+class Command(BaseCommand):
+    help = 'Deletes stored product images that no product references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true',
+                            help='Rebuild reference counts from products before collecting.')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Leave unreferenced files younger than this; their upload may still be saving.')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            fixed = 0
+            for blob in ImageBlob.objects.annotate(refs=Count('products')):
+                if blob.ref_count != blob.refs:
+                    ImageBlob.objects.filter(pk=blob.pk).update(ref_count=blob.refs)
+                    fixed += 1
+            self.stdout.write(f'Corrected {fixed} reference counts.')
+
+        deleted = ImageBlob.collect()
+        stray = ImageBlob.collect_stray_files(grace=timedelta(hours=options['grace_hours']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} orphaned images and {stray} stray files.'))
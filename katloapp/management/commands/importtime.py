@@ -0,0 +1,86 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules that should only be imported by the requests that use them.
+DEFERRED_MODULES = ('qrcode', 'PIL')
+CLOUDINARY_MODULES = ('cloudinary', 'cloudinary_storage')
+
+# Runs in a fresh interpreter: boot the WSGI app the way a gunicorn worker
+# does, resolve the URLconf that the first request would load, and report.
+BOOT_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+from Katlo.wsgi import application
+if %(urls)r:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+print(json.dumps({'boot_ms': elapsed * 1000, 'rss_kb': rss}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measures worker start-up time and memory by booting the WSGI app in fresh interpreters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='Slowest imports to list.')
+        parser.add_argument('--no-urls', action='store_true', help='Skip loading the URLconf.')
+        parser.add_argument('--max-ms', type=float, default=1500,
+                            help='Fail if the median boot time exceeds this.')
+        parser.add_argument('--max-rss-mb', type=float, default=120,
+                            help='Fail if peak RSS exceeds this.')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'Katlo.settings'))
+        script = BOOT_SCRIPT % {'urls': not options['no_urls']}
+        boots, peaks, imports = [], [], []
+        for _ in range(options['runs']):
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                                    cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f'Worker boot failed:\n{result.stderr[-2000:]}')
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            boots.append(stats['boot_ms'])
+            peaks.append(stats['rss_kb'] / 1024)
+            imports = self._parse_importtime(result.stderr)
+
+        boot_ms, rss_mb = statistics.median(boots), max(peaks)
+        self.stdout.write(f"Boot time: median {boot_ms:.1f}ms, min {min(boots):.1f}ms over {len(boots)} runs")
+        self.stdout.write(f"Peak RSS:  {rss_mb:.1f}MB")
+        self.stdout.write('Slowest imports (cumulative):')
+        for module, cumulative_us in sorted(imports, key=lambda i: -i[1])[:options['top']]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f}ms  {module}")
+
+        problems = []
+        deferred = DEFERRED_MODULES
+        if 'cloudinary_storage' not in settings.INSTALLED_APPS:
+            deferred += CLOUDINARY_MODULES
+        loaded = sorted({m for m, _ in imports if m.split('.')[0] in deferred})
+        if loaded:
+            problems.append(f"deferred modules imported at boot: {', '.join(loaded)}")
+        if boot_ms > options['max_ms']:
+            problems.append(f"boot time {boot_ms:.1f}ms exceeds {options['max_ms']:.0f}ms")
+        if rss_mb > options['max_rss_mb']:
+            problems.append(f"peak RSS {rss_mb:.1f}MB exceeds {options['max_rss_mb']:.0f}MB")
+        if problems:
+            raise CommandError('Start-up regression: ' + '; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Start-up within budget.'))
+
+    def _parse_importtime(self, stderr):
+        imports = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, module = line[len('import time:'):].split('|')
+            imports.append((module.strip(), int(cumulative)))
+        return imports
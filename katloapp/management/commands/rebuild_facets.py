@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from katloapp import facets
+from katloapp.models import CatalogFacet
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the discovery facet counts from products'
+
+    def handle(self, *args, **options):
+        facets.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {CatalogFacet.objects.count()} facet rows.'))
@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from katloapp.routers import PRIMARY_ALIAS, REPLICA_ALIAS
+
+
+class Command(BaseCommand):
+    help = 'Copies the primary SQLite database over the local read replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep replicating every N seconds (default: once).')
+
+    def handle(self, *args, **options):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            raise CommandError('No replica configured; set DATABASE_REPLICA_NAME.')
+        primary = settings.DATABASES[PRIMARY_ALIAS]
+        replica = settings.DATABASES[REPLICA_ALIAS]
+        if not all(db['ENGINE'].endswith('sqlite3') for db in (primary, replica)):
+            raise CommandError('replicate_db only copies SQLite databases; use the '
+                               "database's own replication for other engines.")
+
+        while True:
+            start = time.perf_counter()
+            self.replicate(str(primary['NAME']), str(replica['NAME']))
+            self.stdout.write(f'Replicated in {(time.perf_counter() - start) * 1000:.1f}ms')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def replicate(self, source_path, replica_path):
+        # Take a consistent online backup into a temporary file, then swap
+        # it in so readers never see a half-written replica.
+        tmp_path = f'{replica_path}.tmp'
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp_path, replica_path)
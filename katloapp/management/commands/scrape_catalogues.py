@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from katloapp.models import WhatsAppCatalogue
+from katloapp.scraper import WhatsAppCatalogueScraper
+
+
+class Command(BaseCommand):
+    help = 'Imports products from active WhatsApp catalogues (or the given ids)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int)
+        parser.add_argument('--workers', type=int, help='Concurrent fetches.')
+        parser.add_argument('--rate-limit', type=float, help='Seconds between requests to one host.')
+
+    def handle(self, *args, **options):
+        catalogues = WhatsAppCatalogue.objects.select_related('business')
+        catalogues = catalogues.filter(pk__in=options['ids']) if options['ids'] else catalogues.filter(active=True)
+        scraper = WhatsAppCatalogueScraper(workers=options['workers'], rate_limit=options['rate_limit'])
+        for log in scraper.scrape(catalogues):
+            line = (f'{log.catalogue}: {log.status} — found {log.products_found}, '
+                    f'added {log.products_added}, updated {log.products_updated}')
+            self.stdout.write(line + (f' ({log.error})' if log.error else ''))
@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.urls import reverse
 
+from .routers import (STICKY_COOKIE, replica_configured, stop_tracking_writes,
+                      track_writes, writes_made)
+
 class AdminBusinessSeparationMiddleware:
     """
     Middleware to handle admin and business user separation
@@ -21,4 +25,23 @@ class AdminBusinessSeparationMiddleware:
             )
 
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+class ReplicaStickinessMiddleware:
+    """
+    After a request writes to the primary database, set a short-lived
+    cookie so that visitor's next reads skip the (possibly lagging) replica.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = track_writes()
+        try:
+            response = self.get_response(request)
+            if writes_made() and replica_configured():
+                response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                    httponly=True, samesite='Lax')
+        finally:
+            stop_tracking_writes(token)
+        return response
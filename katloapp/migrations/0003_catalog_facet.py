@@ -0,0 +1,74 @@
+# Generated by Django 5.0.7 on 2026-10-19 03:08
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+# facets.PRICE_BUCKETS as of this migration: (slug, lower bound inclusive,
+# upper bound exclusive). Migrations must not follow later edits to it.
+PRICE_BUCKETS = (
+    ('under-500', None, Decimal('500')),
+    ('500-2000', Decimal('500'), Decimal('2000')),
+    ('2000-10000', Decimal('2000'), Decimal('10000')),
+    ('10000-plus', Decimal('10000'), None),
+)
+
+
+def price_bucket(price):
+    if price is None:
+        return 'no-price'
+    for slug, low, high in PRICE_BUCKETS:
+        if (low is None or price >= low) and (high is None or price < high):
+            return slug
+    return 'no-price'
+
+
+def populate_facets(apps, schema_editor):
+    Business = apps.get_model('katloapp', 'Business')
+    CatalogFacet = apps.get_model('katloapp', 'CatalogFacet')
+    rows = []
+    for business in Business.objects.all().iterator():
+        counts = {}
+        for price, n in (business.products.filter(active=True).order_by()
+                         .values_list('price').annotate(n=Count('pk'))):
+            bucket = price_bucket(price)
+            counts[bucket] = counts.get(bucket, 0) + n
+        rows.extend(
+            CatalogFacet(business=business, price_bucket=bucket, product_count=n,
+                         city=business.city, native_place=business.native_place,
+                         public=business.public)
+            for bucket, n in counts.items()
+        )
+    CatalogFacet.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('katloapp', '0002_image_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.CharField(max_length=20)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('native_place', models.CharField(blank=True, max_length=100)),
+                ('public', models.BooleanField(default=True)),
+                ('product_count', models.IntegerField(default=0)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='katloapp.business')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['public', 'city', 'native_place', 'price_bucket', 'product_count'], name='katloapp_ca_public_b49432_idx'), models.Index(fields=['public', 'native_place', 'city', 'price_bucket', 'product_count'], name='katloapp_ca_public_ace695_idx'), models.Index(fields=['public', 'price_bucket', 'city', 'native_place', 'product_count'], name='katloapp_ca_public_403f12_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='catalogfacet',
+            constraint=models.UniqueConstraint(fields=('business', 'price_bucket'), name='unique_business_price_bucket'),
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.0.7 on 2026-10-19 03:11
+
+from django.db import migrations, models
+
+
+# changefeed's serializers as of this migration; later changes to the feed
+# format must not alter what this backfill wrote.
+def serialize_business(business):
+    return {
+        'id': business.pk,
+        'slug': business.slug,
+        'name': business.name,
+        'description': business.description,
+        'whatsapp_number': business.whatsapp_number,
+        'city': business.city,
+        'native_place': business.native_place,
+        'public': business.public,
+        'created_at': business.created_at.isoformat(),
+    }
+
+
+def serialize_product(product):
+    return {
+        'id': product.pk,
+        'business_id': product.business_id,
+        'name': product.name,
+        'price': str(product.price) if product.price is not None else None,
+        'description': product.description,
+        'image': product.image.url if product.image else None,
+        'sku': product.sku,
+        'active': product.active,
+        'created_at': product.created_at.isoformat(),
+    }
+
+
+def backfill_change_log(apps, schema_editor):
+    ChangeLogEntry = apps.get_model('katloapp', 'ChangeLogEntry')
+    # Private catalogs are never published to mirrors.
+    for model_name, serialize, public in (('Business', serialize_business, {'public': True}),
+                                          ('Product', serialize_product, {'business__public': True})):
+        model = apps.get_model('katloapp', model_name)
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(object_type=model_name.lower(), object_id=obj.pk,
+                           action='upsert', data=serialize(obj))
+            for obj in model.objects.filter(**public).order_by('pk').iterator()
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('katloapp', '0003_catalog_facet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogCompaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purged_through', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('object_type', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(max_length=10)),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['seq'],
+                'indexes': [models.Index(fields=['object_type', 'object_id', 'seq'], name='katloapp_ch_object__026ba8_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_change_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.7 on 2026-10-19 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('katloapp', '0004_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppCatalogue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150)),
+                ('url', models.URLField(max_length=500)),
+                ('active', models.BooleanField(default=True)),
+                ('etag', models.CharField(blank=True, max_length=200)),
+                ('last_modified', models.CharField(blank=True, max_length=100)),
+                ('last_scraped_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalogues', to='katloapp.business')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScrapeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('success', 'Success'), ('not_modified', 'Not modified'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('products_found', models.PositiveIntegerField(default=0)),
+                ('products_added', models.PositiveIntegerField(default=0)),
+                ('products_updated', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('catalogue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scrape_logs', to='katloapp.whatsappcatalogue')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
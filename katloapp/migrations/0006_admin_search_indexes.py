@@ -0,0 +1,69 @@
+# Generated by Django 5.0.7 on 2026-10-19 03:19
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+# (index, table, column) for the admin's case-insensitive searches.
+SEARCH_INDEXES = (
+    ('katloapp_business_name_ci', 'katloapp_business', 'name'),
+    ('katloapp_product_name_ci', 'katloapp_product', 'name'),
+    ('katloapp_product_sku_ci', 'katloapp_product', 'sku'),
+)
+# Each database writes those searches differently: SQLite's LIKE ignores
+# case and can use a NOCASE index, PostgreSQL compares UPPER(column::text)
+# and needs pattern ops for LIKE prefixes. Others get no index.
+INDEX_EXPRESSIONS = {
+    'sqlite': '"{column}" COLLATE NOCASE',
+    'postgresql': 'UPPER("{column}"::text) text_pattern_ops',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    expression = INDEX_EXPRESSIONS.get(schema_editor.connection.vendor)
+    if expression is None:
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(f'CREATE INDEX "{name}" ON "{table}" ({expression.format(column=column)})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in INDEX_EXPRESSIONS:
+        for name, _, _ in SEARCH_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('katloapp', '0005_whatsapp_catalogue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='business',
+            index=models.Index(fields=['whatsapp_number'], name='katloapp_bu_whatsap_f4ecaf_idx'),
+        ),
+        # The state keeps the SQLite form, which is what SQLite rebuilds
+        # when it remakes a table; the database gets the vendor's own form.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='business',
+                    index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='katloapp_business_name_ci'),
+                ),
+                migrations.AddIndex(
+                    model_name='product',
+                    index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='katloapp_product_name_ci'),
+                ),
+                migrations.AddIndex(
+                    model_name='product',
+                    index=models.Index(django.db.models.functions.comparison.Collate('sku', 'NOCASE'), name='katloapp_product_sku_ci'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_indexes, drop_search_indexes),
+            ],
+        ),
+    ]
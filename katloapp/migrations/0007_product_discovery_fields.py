@@ -0,0 +1,81 @@
+# Generated by Django 5.0.7 on 2026-10-19 03:49
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Q, Subquery
+
+# facets.PRICE_BUCKETS as of this migration, without the catch-all
+# 'no-price' bucket.
+PRICE_BUCKETS = (
+    ('under-500', None, Decimal('500')),
+    ('500-2000', Decimal('500'), Decimal('2000')),
+    ('2000-10000', Decimal('2000'), Decimal('10000')),
+    ('10000-plus', Decimal('10000'), None),
+)
+
+
+def populate_discovery_fields(apps, schema_editor):
+    Business = apps.get_model('katloapp', 'Business')
+    Product = apps.get_model('katloapp', 'Product')
+    business = Business.objects.filter(pk=OuterRef('business_id'))
+    Product.objects.update(
+        city=Subquery(business.values('city')[:1]),
+        native_place=Subquery(business.values('native_place')[:1]),
+        public=Subquery(business.values('public')[:1]),
+        price_bucket='no-price',
+    )
+    for slug, low, high in PRICE_BUCKETS:
+        q = Q(price__isnull=False)
+        if low is not None:
+            q &= Q(price__gte=low)
+        if high is not None:
+            q &= Q(price__lt=high)
+        Product.objects.filter(q).update(price_bucket=slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('katloapp', '0006_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='city',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='native_place',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_bucket',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='public',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunPython(populate_discovery_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('active', True), ('public', True)), fields=['-created_at', '-id'], name='product_discover_all'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('active', True), ('public', True)), fields=['city', '-created_at', '-id'], name='product_discover_city'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('active', True), ('public', True)), fields=['native_place', '-created_at', '-id'], name='product_discover_native'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('active', True), ('public', True)), fields=['price_bucket', '-created_at', '-id'], name='product_discover_price'),
+        ),
+    ]
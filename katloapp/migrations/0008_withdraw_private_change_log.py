@@ -0,0 +1,37 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:20
+
+from django.db import migrations
+
+
+def withdraw_private_entries(apps, schema_editor):
+    """
+    Strip the data from logged upserts of private businesses and their
+    products, and log a tombstone for each so mirrors that already read
+    them drop them.
+    """
+    Business = apps.get_model('katloapp', 'Business')
+    Product = apps.get_model('katloapp', 'Product')
+    ChangeLogEntry = apps.get_model('katloapp', 'ChangeLogEntry')
+    private = {
+        'business': Business.objects.filter(public=False).values('pk'),
+        'product': Product.objects.filter(business__public=False).values('pk'),
+    }
+    for object_type, ids in private.items():
+        upserts = ChangeLogEntry.objects.filter(object_type=object_type, object_id__in=ids, action='upsert')
+        withdrawn = list(upserts.values_list('object_id', flat=True).distinct())
+        upserts.update(action='delete', data=None)
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(object_type=object_type, object_id=object_id, action='delete')
+            for object_id in withdrawn
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('katloapp', '0007_product_discovery_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(withdraw_private_entries, migrations.RunPython.noop),
+    ]
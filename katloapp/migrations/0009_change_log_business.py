@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-19 04:10
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def populate_business_ids(apps, schema_editor):
+    # Tombstones of products that no longer exist are left without one.
+    ChangeLogEntry = apps.get_model('katloapp', 'ChangeLogEntry')
+    Product = apps.get_model('katloapp', 'Product')
+    ChangeLogEntry.objects.filter(object_type='business').update(business_id=F('object_id'))
+    ChangeLogEntry.objects.filter(object_type='product').update(business_id=Subquery(
+        Product.objects.filter(pk=OuterRef('object_id')).values('business_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('katloapp', '0008_withdraw_private_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changelogentry',
+            name='business_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_business_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['business_id', 'seq'], name='katloapp_ch_busines_d48836_idx'),
+        ),
+    ]
@@ -1,5 +1,10 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Collate, Greatest
+from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 
@@ -17,6 +22,14 @@ class Business(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Admin search. SQLite's LIKE ignores case, so a prefix match
+            # can only use an index built with the NOCASE collation. These
+            # are created per database by migration 0006; PostgreSQL gets
+            # UPPER() pattern-ops indexes of the same names instead.
+            models.Index(Collate('name', 'NOCASE'), name='katloapp_business_name_ci'),
+            models.Index(fields=['whatsapp_number']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -27,7 +40,9 @@ class Business(models.Model):
                 slug = f"{base}-{i}"
                 i += 1
             self.slug = slug
-        super().save(*args, **kwargs)
+        # Atomic with the facet and change-log writes made by signal handlers.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def get_public_url(self):
         return reverse('katloapp:public_catalog', kwargs={'slug': self.slug})
@@ -35,18 +50,267 @@ class Business(models.Model):
     def __str__(self):
         return self.name
 
+def image_blob_upload_to(instance, filename):
+    ext = filename.rsplit('.', 1)[-1]
+    return f"products/{instance.sha256[:2]}/{instance.sha256}.{ext}"
+
+class ImageBlob(models.Model):
+    """A stored product image, addressed by the SHA-256 of its bytes."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.ImageField(upload_to=image_blob_upload_to)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    size = models.PositiveIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def acquire(cls, upload):
+        """
+        Return the blob for an uploaded file with one more reference taken.
+
+        Identical bytes resolve to the existing blob, so the file is only
+        written to storage the first time it is seen.
+        """
+        from .utils import file_sha256, image_extension
+
+        digest = file_sha256(upload)
+        updated = cls.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1)
+        if not updated:
+            blob = cls(sha256=digest, size=upload.size, ref_count=1,
+                       width=getattr(upload, 'width', None),
+                       height=getattr(upload, 'height', None))
+            blob.file.save(f"{digest}.{image_extension(upload)}", upload, save=False)
+            try:
+                with transaction.atomic():
+                    blob.save()
+                return blob
+            except IntegrityError:
+                # Another request stored the same bytes first; use theirs.
+                blob.file.delete(save=False)
+                cls.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1)
+        return cls.objects.get(sha256=digest)
+
+    @classmethod
+    def release(cls, pk, count=1):
+        """Drop references to a blob and collect it once nothing uses it."""
+        cls.objects.filter(pk=pk).update(ref_count=Greatest(F('ref_count') - count, 0))
+        transaction.on_commit(lambda: cls.collect(pk))
+
+    @classmethod
+    def collect(cls, pk=None):
+        """Delete unreferenced blobs and their stored files."""
+        orphans = cls.objects.filter(ref_count__lte=0)
+        if pk is not None:
+            orphans = orphans.filter(pk=pk)
+        deleted = 0
+        for blob_pk, name in orphans.values_list('pk', 'file'):
+            # Re-check the count in the DELETE itself: an acquire() may have
+            # taken a reference since the blob was selected.
+            _, rows = cls.objects.filter(pk=blob_pk, ref_count__lte=0).delete()
+            if rows.get(cls._meta.label):
+                cls._meta.get_field('file').storage.delete(name)
+                deleted += 1
+        return deleted
+
+    @classmethod
+    def collect_stray_files(cls, grace=timedelta(hours=24)):
+        """
+        Delete files in the blob directories that no blob references, such
+        as those written by an acquire() whose transaction rolled back.
+        Files younger than grace are left alone, as their transaction may
+        still be open.
+        """
+        storage = cls._meta.get_field('file').storage
+        try:
+            shards, _ = storage.listdir('products')
+        except (FileNotFoundError, NotImplementedError):
+            return 0
+        referenced = set(cls.objects.values_list('file', flat=True))
+        cutoff = timezone.now() - grace
+        deleted = 0
+        for shard in shards:
+            _, files = storage.listdir(f'products/{shard}')
+            for filename in files:
+                name = f'products/{shard}/{filename}'
+                if name in referenced or storage.get_modified_time(name) >= cutoff:
+                    continue
+                storage.delete(name)
+                deleted += 1
+        return deleted
+
+    def __str__(self):
+        return self.sha256
+
+# Products shown on the discovery pages.
+DISCOVERABLE = models.Q(active=True, public=True)
+
 class Product(models.Model):
     business = models.ForeignKey(Business, related_name='products', on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image_blob = models.ForeignKey(ImageBlob, related_name='products', null=True, blank=True,
+                                   editable=False, on_delete=models.SET_NULL)
     sku = models.CharField(max_length=100, blank=True)
     active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Copies of the business's facet fields and of the product's price
+    # bucket, kept in step by save(), scraper.import_products() and
+    # facets.sync_price_buckets() after bulk price changes, so
+    # discovery filters and orders products without joining Business.
+    city = models.CharField(max_length=100, blank=True, editable=False)
+    native_place = models.CharField(max_length=100, blank=True, editable=False)
+    public = models.BooleanField(default=True, editable=False)
+    price_bucket = models.CharField(max_length=20, blank=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Admin search; see Business.Meta.
+            models.Index(Collate('name', 'NOCASE'), name='katloapp_product_name_ci'),
+            models.Index(Collate('sku', 'NOCASE'), name='katloapp_product_sku_ci'),
+            # Discovery pages walk one of these newest first and stop after
+            # a page; a second filter is checked on the rows walked.
+            models.Index(fields=['-created_at', '-id'], condition=DISCOVERABLE,
+                         name='product_discover_all'),
+            models.Index(fields=['city', '-created_at', '-id'], condition=DISCOVERABLE,
+                         name='product_discover_city'),
+            models.Index(fields=['native_place', '-created_at', '-id'], condition=DISCOVERABLE,
+                         name='product_discover_native'),
+            models.Index(fields=['price_bucket', '-created_at', '-id'], condition=DISCOVERABLE,
+                         name='product_discover_price'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .facets import price_bucket
+
+        self.city, self.native_place = self.business.city, self.business.native_place
+        self.public = self.business.public
+        self.price_bucket = price_bucket(self.price)
+        # One transaction covers the row, its image reference and the facet
+        # and change-log writes made by signal handlers.
+        with transaction.atomic():
+            previous_blob_id = self.image_blob_id
+            acquired = False
+            if self.image and not self.image._committed:
+                # Route fresh uploads through the content-addressed blob
+                # store so identical images share one stored file.
+                blob = ImageBlob.acquire(self.image.file)
+                self.image = blob.file.name
+                self.image_blob = blob
+                acquired = True
+            elif not self.image:
+                self.image_blob = None
+            super().save(*args, **kwargs)
+            # acquire() took a new reference even if the upload matches the
+            # current image, so the old one is always dropped after it.
+            if previous_blob_id and (acquired or previous_blob_id != self.image_blob_id):
+                ImageBlob.release(previous_blob_id)
 
     def __str__(self):
         return f"{self.name} — {self.business.name}"
+
+class CatalogFacet(models.Model):
+    """
+    Count of a business's active products in one price bucket, with the
+    business's facet fields copied alongside so discovery counts are a
+    small GROUP BY over this table instead of over Product.
+    """
+    business = models.ForeignKey(Business, related_name='facets', on_delete=models.CASCADE)
+    price_bucket = models.CharField(max_length=20)
+    city = models.CharField(max_length=100, blank=True)
+    native_place = models.CharField(max_length=100, blank=True)
+    public = models.BooleanField(default=True)
+    product_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['business', 'price_bucket'], name='unique_business_price_bucket'),
+        ]
+        indexes = [
+            # Covering indexes: facet counts never touch the table itself.
+            models.Index(fields=['public', 'city', 'native_place', 'price_bucket', 'product_count']),
+            models.Index(fields=['public', 'native_place', 'city', 'price_bucket', 'product_count']),
+            models.Index(fields=['public', 'price_bucket', 'city', 'native_place', 'product_count']),
+        ]
+
+    def __str__(self):
+        return f"{self.business_id}/{self.price_bucket}: {self.product_count}"
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only record of catalog changes for partner mirrors. seq only
+    ever increases; a 'delete' entry with no data is a tombstone.
+    """
+    ACTION_UPSERT = 'upsert'
+    ACTION_DELETE = 'delete'
+
+    seq = models.BigAutoField(primary_key=True)
+    object_type = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    # The business whose catalog the object is in, kept for tombstones too,
+    # so each catalog's latest seq is one index lookup.
+    business_id = models.BigIntegerField(null=True, blank=True)
+    action = models.CharField(max_length=10)
+    data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+        indexes = [
+            models.Index(fields=['object_type', 'object_id', 'seq']),
+            models.Index(fields=['business_id', 'seq']),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.action} {self.object_type}:{self.object_id}"
+
+class ChangeLogCompaction(models.Model):
+    """Tombstones up to purged_through were deleted; older cursors must resync."""
+    purged_through = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class WhatsAppCatalogue(models.Model):
+    """An external product page that is imported into a business's catalog."""
+    business = models.ForeignKey(Business, related_name='catalogues', on_delete=models.CASCADE)
+    name = models.CharField(max_length=150)
+    url = models.URLField(max_length=500)
+    active = models.BooleanField(default=True)
+    # Validators from the last successful fetch, sent back as conditional
+    # request headers so unchanged pages cost a 304.
+    etag = models.CharField(max_length=200, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)
+    last_scraped_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+class ScrapeLog(models.Model):
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCESS = 'success'
+    STATUS_NOT_MODIFIED = 'not_modified'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCESS, 'Success'),
+        (STATUS_NOT_MODIFIED, 'Not modified'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    catalogue = models.ForeignKey(WhatsAppCatalogue, related_name='scrape_logs', on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    products_found = models.PositiveIntegerField(default=0)
+    products_added = models.PositiveIntegerField(default=0)
+    products_updated = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.catalogue} — {self.status}"
@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.shortcuts import redirect
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """'5/m' -> (capacity 5, refill 5/60 tokens per second)."""
+    count, _, period = rate.partition('/')
+    count, seconds = int(count), PERIODS[period]
+    return count, count / seconds
+
+
+def _refill(bucket, capacity, refill_rate, now):
+    if bucket is None:
+        return capacity
+    tokens, stamp = bucket
+    return min(capacity, tokens + max(0.0, now - stamp) * refill_rate)
+
+
+class LocalBucketStore:
+    """
+    Token buckets held in this process. Each worker limits on its own, so
+    the effective limit is the configured rate times the worker count.
+    The least recently used buckets are dropped past max_keys.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        """Take a token; returns 0 if allowed, else seconds until one is free."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = _refill(self._buckets.pop(key, None), capacity, refill_rate, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / refill_rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Token buckets in a Django cache shared by all workers. The read and
+    write are not atomic, so concurrent requests may occasionally both get
+    the last token; that is fine for abuse protection.
+
+    The cache may hold sessions and pages too, so clear() does not empty
+    it: buckets are stored under a generation number (the cache key
+    version) that clear() moves on, and the old ones simply expire.
+    """
+    generation_key = 'rl:generation'
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def _generation(self):
+        return self.cache.get_or_set(self.generation_key, 1, timeout=None)
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.time()
+        generation = self._generation()
+        tokens = _refill(self.cache.get(key, version=generation), capacity, refill_rate, now)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # Once a bucket has had time to refill it is the same as no bucket.
+        self.cache.set(key, (tokens, now), timeout=math.ceil(capacity / refill_rate), version=generation)
+        return 0 if allowed else (1 - tokens) / refill_rate
+
+    def clear(self):
+        self._generation()
+        self.cache.incr(self.generation_key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The bucket store named by RATE_LIMIT_CACHE, or a per-process one."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            alias = getattr(settings, 'RATE_LIMIT_CACHE', None)
+            _store = CacheBucketStore(alias) if alias else LocalBucketStore()
+        return _store
+
+
+def client_ip(request):
+    """
+    The client's address. Behind RATE_LIMIT_TRUSTED_PROXIES proxies it is
+    the X-Forwarded-For entry added by the outermost one; anything further
+    left was sent by the client and cannot be trusted.
+    """
+    proxies = getattr(settings, 'RATE_LIMIT_TRUSTED_PROXIES', 0)
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _identity(request, kind):
+    if kind == 'ip':
+        return client_ip(request)
+    if kind == 'username':
+        return request.POST.get('username', '').strip().lower()
+    if kind == 'ip_username':
+        # A per-username bucket alone lets anyone lock a user out by
+        # failing their login; this one only slows the client doing it.
+        username = _identity(request, 'username')
+        return f'{client_ip(request)}|{username}' if username else ''
+    if kind == 'user':
+        return str(request.user.pk) if request.user.is_authenticated else ''
+    raise ValueError(f'Unknown rate limit key: {kind}')
+
+
+def check_rate_limit(request, scope):
+    """
+    Take a token from every bucket configured for scope in RATE_LIMITS;
+    returns 0 if the request may proceed, else seconds to wait.
+    """
+    store = get_store()
+    for kind, rate in settings.RATE_LIMITS.get(scope, {}).items():
+        identity = _identity(request, kind)
+        if not identity:
+            continue
+        digest = hashlib.sha256(identity.encode()).hexdigest()[:32]
+        retry_after = store.consume(f'rl:{scope}:{kind}:{digest}', *parse_rate(rate))
+        if retry_after:
+            logger.warning('Rate limit %s/%s hit by %s', scope, kind, client_ip(request))
+            return retry_after
+    return 0
+
+
+def rate_limit(scope, methods=('POST',), redirect_to=None):
+    """
+    Apply the RATE_LIMITS for scope to requests with the given methods.
+
+    Over the limit, the view is not called: the visitor is sent back to
+    the same page (or redirect_to) with an error message and Retry-After.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                retry_after = check_rate_limit(request, scope)
+                if retry_after:
+                    seconds = math.ceil(retry_after)
+                    messages.error(request, f'Too many attempts. Please try again in {seconds} seconds.')
+                    response = redirect(redirect_to or request.get_full_path())
+                    response['Retry-After'] = str(seconds)
+                    return response
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
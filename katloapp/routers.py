@@ -0,0 +1,75 @@
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+PRIMARY_ALIAS = 'default'
+STICKY_COOKIE = 'katlo_primary'
+# Public catalog data. Sessions and users always come from the primary,
+# where a login or logout has certainly landed.
+REPLICA_MODELS = frozenset({
+    'katloapp.Business', 'katloapp.Product', 'katloapp.CatalogFacet', 'katloapp.ChangeLogEntry',
+})
+
+_use_replica = ContextVar('katlo_use_replica', default=False)
+_wrote = ContextVar('katlo_wrote', default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    """
+    Send catalog reads made inside read_from_replica views to the replica
+    and everything else, including all writes, to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.label in REPLICA_MODELS and replica_configured():
+            return REPLICA_ALIAS
+        return PRIMARY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        wrote = _wrote.get()
+        if wrote is not None:
+            wrote.append(model._meta.label)
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary made by replicate_db.
+        return db == PRIMARY_ALIAS
+
+
+def track_writes():
+    """Start recording writes for the current request; returns a reset token."""
+    return _wrote.set([])
+
+
+def writes_made():
+    return bool(_wrote.get())
+
+
+def stop_tracking_writes(token):
+    _wrote.reset(token)
+
+
+def read_from_replica(view_func):
+    """
+    Serve a read-only view from the replica, unless the visitor wrote
+    something recently and carries the read-your-writes cookie.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if STICKY_COOKIE in request.COOKIES:
+            return view_func(request, *args, **kwargs)
+        token = _use_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
@@ -0,0 +1,347 @@
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .facets import price_bucket
+from .models import Business, Product, ScrapeLog, WhatsAppCatalogue
+from .signals import products_bulk_changed
+
+logger = logging.getLogger(__name__)
+
+ScrapedProduct = namedtuple('ScrapedProduct', 'name price description image sku')
+
+WHATSAPP_HOSTS = ('wa.me', 'api.whatsapp.com', 'web.whatsapp.com', 'chat.whatsapp.com')
+
+SAMPLE_PRODUCTS = [
+    ScrapedProduct('Sample Handmade Candle', Decimal('249.00'), 'Soy wax candle in a glass jar.', None, 'SAMPLE-001'),
+    ScrapedProduct('Sample Cotton Tote', Decimal('399.00'), 'Printed cotton tote bag.', None, 'SAMPLE-002'),
+    ScrapedProduct('Sample Gift Card', None, 'Price on request.', None, 'SAMPLE-003'),
+]
+
+
+class HostRateLimiter:
+    """Spaces requests to the same host at least min_interval seconds apart."""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        # Reserve the slot under the lock, sleep outside it so other hosts
+        # are not held up.
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PageParser(HTMLParser):
+    """Collects the title, JSON-LD blocks, meta tags and product-like markup of a page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ''
+        self.json_ld = []
+        self.meta = {}
+        self.product_elements = 0
+        self.headings = 0
+        self._in_title = False
+        self._in_json_ld = False
+        self._buffer = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'title':
+            self._in_title = True
+        elif tag == 'script' and (attrs.get('type') or '').lower() == 'application/ld+json':
+            self._in_json_ld = True
+            self._buffer = []
+        elif tag == 'meta':
+            key = attrs.get('property') or attrs.get('name')
+            if key and attrs.get('content') is not None:
+                self.meta.setdefault(key.lower(), attrs['content'])
+        if tag in ('h2', 'h3'):
+            self.headings += 1
+        if 'product' in (attrs.get('class') or '').lower() or 'data-product' in attrs:
+            self.product_elements += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        elif tag == 'script' and self._in_json_ld:
+            self._in_json_ld = False
+            self.json_ld.append(''.join(self._buffer))
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif self._in_json_ld:
+            self._buffer.append(data)
+
+
+def parse_page(html):
+    parser = PageParser()
+    parser.feed(html)
+    parser.close()
+    parser.title = parser.title.strip()
+    return parser
+
+
+def _parse_price(value):
+    if value is None:
+        return None
+    try:
+        price = Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        return None
+    return price if price >= 0 else None
+
+
+def _first(value):
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def _is_product(node):
+    types = node.get('@type')
+    types = types if isinstance(types, list) else [types]
+    return 'Product' in types
+
+
+def _walk_json_ld(node):
+    """Yield every Product node in a JSON-LD document, wherever it is nested."""
+    if isinstance(node, list):
+        for item in node:
+            yield from _walk_json_ld(item)
+    elif isinstance(node, dict):
+        if _is_product(node):
+            yield node
+            return
+        for key in ('@graph', 'itemListElement', 'item', 'mainEntity', 'hasOfferCatalog'):
+            if key in node:
+                yield from _walk_json_ld(node[key])
+
+
+def _product_from_json_ld(node):
+    offers = _first(node.get('offers')) or {}
+    price = offers.get('price', offers.get('lowPrice')) if isinstance(offers, dict) else None
+    image = _first(node.get('image'))
+    if isinstance(image, dict):
+        image = image.get('url')
+    name = (node.get('name') or '').strip()
+    if not name:
+        return None
+    return ScrapedProduct(
+        name=name[:200],
+        price=_parse_price(price),
+        description=(node.get('description') or '').strip(),
+        image=image,
+        sku=str(node.get('sku') or node.get('productID') or '')[:100],
+    )
+
+
+def extract_products(html):
+    """
+    Products on a page, taken from JSON-LD where present and falling back
+    to OpenGraph product tags.
+    """
+    page = parse_page(html)
+    products = []
+    for block in page.json_ld:
+        try:
+            document = json.loads(block)
+        except ValueError:
+            continue
+        for node in _walk_json_ld(document):
+            product = _product_from_json_ld(node)
+            if product:
+                products.append(product)
+    if products:
+        return products
+
+    meta = page.meta
+    if meta.get('og:type') == 'product' or 'product:price:amount' in meta:
+        name = (meta.get('og:title') or page.title).strip()
+        if name:
+            products.append(ScrapedProduct(
+                name=name[:200],
+                price=_parse_price(meta.get('product:price:amount')),
+                description=(meta.get('og:description') or '').strip(),
+                image=meta.get('og:image'),
+                sku='',
+            ))
+    return products
+
+
+def _product_key(sku, name):
+    return ('sku', sku) if sku else ('name', name.strip().lower())
+
+
+def import_products(business, scraped):
+    """
+    Bulk-upsert scraped products into the business's catalog, matching on
+    SKU or, without one, on name. Returns (added, updated).
+    """
+    incoming = {}
+    for item in scraped:
+        incoming[_product_key(item.sku, item.name)] = item
+
+    existing = {
+        _product_key(p.sku, p.name): p
+        for p in business.products.only('pk', 'name', 'sku', 'price', 'description')
+    }
+    to_create, to_update = [], []
+    for key, item in incoming.items():
+        product = existing.get(key)
+        if product is None:
+            # bulk_create skips Product.save(), so fill in its copied fields.
+            to_create.append(Product(business=business, name=item.name, price=item.price,
+                                     description=item.description, sku=item.sku,
+                                     city=business.city, native_place=business.native_place,
+                                     public=business.public, price_bucket=price_bucket(item.price)))
+        elif (product.name, product.price, product.description) != (item.name, item.price, item.description):
+            product.name, product.price, product.description = item.name, item.price, item.description
+            product.price_bucket = price_bucket(item.price)
+            to_update.append(product)
+
+    if not to_create and not to_update:
+        return 0, 0
+    with transaction.atomic():
+        created = Product.objects.bulk_create(to_create, batch_size=500)
+        Product.objects.bulk_update(to_update, ['name', 'price', 'description', 'price_bucket'], batch_size=500)
+        products_bulk_changed.send(
+            sender=Business, business=business, action='import',
+            count=len(created) + len(to_update),
+            product_ids=[p.pk for p in created] + [p.pk for p in to_update],
+        )
+    return len(created), len(to_update)
+
+
+class WhatsAppCatalogueScraper:
+    """
+    Fetches catalogue pages concurrently over a pooled HTTP session with
+    per-host rate limiting and conditional requests, then imports the
+    products found on them.
+    """
+
+    def __init__(self, workers=None, rate_limit=None, timeout=None, session=None):
+        self.workers = workers or settings.SCRAPER_WORKERS
+        self.timeout = timeout or settings.SCRAPER_TIMEOUT
+        if rate_limit is None:
+            rate_limit = settings.SCRAPER_RATE_LIMIT_SECONDS
+        self.rate_limiter = HostRateLimiter(rate_limit)
+        self.session = session or self._build_session()
+
+    def _build_session(self):
+        # requests is only needed when scraping, so keep it out of worker boot.
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers, max_retries=1)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'User-Agent': settings.SCRAPER_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.5',
+        })
+        return session
+
+    def _determine_url_type(self, url):
+        host = (urlsplit(url).hostname or '').lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        if host in WHATSAPP_HOSTS:
+            return 'wa_me'
+        return 'website'
+
+    def _fetch_page(self, url, etag='', last_modified=''):
+        """GET a page; returns the response (200 or 304) or None if it failed."""
+        from requests import RequestException
+
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        self.rate_limiter.wait(urlsplit(url).hostname or '')
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except RequestException as e:
+            logger.warning('Fetching %s failed: %s', url, e)
+            return None
+        if response.status_code == 304 or response.ok:
+            return response
+        logger.warning('Fetching %s returned HTTP %s', url, response.status_code)
+        return None
+
+    def _fetch(self, catalogue):
+        if self._determine_url_type(catalogue.url) == 'wa_me':
+            return catalogue, None, 'WhatsApp chat links cannot be scraped for products.'
+        response = self._fetch_page(catalogue.url, catalogue.etag, catalogue.last_modified)
+        if response is None:
+            return catalogue, None, 'URL is not accessible.'
+        return catalogue, response, ''
+
+    def scrape(self, catalogues):
+        """Scrape catalogues concurrently; returns their ScrapeLogs."""
+        catalogues = list(catalogues)
+        logs = {c.pk: ScrapeLog.objects.create(catalogue=c) for c in catalogues}
+        # Only the fetches run on the pool; database writes stay on this thread.
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='katlo-scraper') as pool:
+            for catalogue, response, error in pool.map(self._fetch, catalogues):
+                self._record(logs[catalogue.pk], catalogue, response, error)
+        return list(logs.values())
+
+    def _record(self, log, catalogue, response, error):
+        try:
+            if error:
+                log.status, log.error = ScrapeLog.STATUS_FAILED, error
+            elif response.status_code == 304:
+                log.status = ScrapeLog.STATUS_NOT_MODIFIED
+            else:
+                products = extract_products(response.text)
+                log.products_found = len(products)
+                log.products_added, log.products_updated = import_products(catalogue.business, products)
+                log.status = ScrapeLog.STATUS_SUCCESS
+                catalogue.etag = response.headers.get('ETag', '')
+                catalogue.last_modified = response.headers.get('Last-Modified', '')
+            if log.status != ScrapeLog.STATUS_FAILED:
+                catalogue.last_scraped_at = timezone.now()
+                catalogue.save(update_fields=['etag', 'last_modified', 'last_scraped_at'])
+        except Exception as e:
+            logger.exception('Importing %s failed', catalogue.url)
+            log.status, log.error = ScrapeLog.STATUS_FAILED, str(e)
+        log.finished_at = timezone.now()
+        log.save()
+
+
+def scrape_whatsapp_catalogue(catalogue_id, use_sample_data=False):
+    """Scrape one catalogue, or import SAMPLE_PRODUCTS into it; returns the ScrapeLog."""
+    try:
+        catalogue = WhatsAppCatalogue.objects.select_related('business').get(pk=catalogue_id)
+    except WhatsAppCatalogue.DoesNotExist:
+        return None
+    if not use_sample_data:
+        return WhatsAppCatalogueScraper(workers=1).scrape([catalogue])[0]
+
+    log = ScrapeLog.objects.create(catalogue=catalogue, products_found=len(SAMPLE_PRODUCTS))
+    log.products_added, log.products_updated = import_products(catalogue.business, SAMPLE_PRODUCTS)
+    log.status = ScrapeLog.STATUS_SUCCESS
+    log.finished_at = timezone.now()
+    log.save()
+    return log
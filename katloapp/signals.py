@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import changefeed, facets
+from .models import Business, ChangeLogEntry, ImageBlob, Product
+
+# Sent once per bulk operation on a business's products (see bulk.py) with
+# business, action, count and product_ids; per-row model signals are not
+# sent for these, or are ignored inside bulk_products().
+products_bulk_changed = Signal()
+
+_in_bulk = ContextVar('katlo_in_bulk', default=False)
+
+
+@contextmanager
+def bulk_products():
+    """
+    Have the per-row Product delete handlers below do nothing in this
+    context; the caller does their work once for the whole batch and
+    sends products_bulk_changed.
+    """
+    token = _in_bulk.set(True)
+    try:
+        yield
+    finally:
+        _in_bulk.reset(token)
+
+
+@receiver(post_delete, sender=Product)
+def release_product_image(sender, instance, **kwargs):
+    """Drop the deleted product's reference to its shared image."""
+    if instance.image_blob_id and not _in_bulk.get():
+        ImageBlob.release(instance.image_blob_id)
+
+
+def _facet_key(business_id, price, active):
+    return (business_id, facets.price_bucket(price)) if active else None
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_facet(sender, instance, raw=False, **kwargs):
+    """Capture the stored facet key so post_save can move the count."""
+    instance._facet_before = None
+    if instance.pk and not raw:
+        before = (Product.objects.filter(pk=instance.pk)
+                  .values_list('business_id', 'price', 'active').first())
+        instance._facet_before = before and _facet_key(*before)
+
+
+@receiver(post_save, sender=Product)
+def update_product_facet(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_facet_before', None)
+    new = _facet_key(instance.business_id, instance.price, instance.active)
+    if old != new:
+        if old:
+            facets.adjust(*old, -1)
+        if new:
+            facets.adjust(*new, 1)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_facet(sender, instance, **kwargs):
+    if _in_bulk.get():
+        return
+    key = _facet_key(instance.business_id, instance.price, instance.active)
+    if key:
+        facets.adjust(*key, -1)
+
+
+@receiver(post_save, sender=Business)
+def update_business_facets(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        facets.sync_business_fields(instance)
+
+
+@receiver(products_bulk_changed)
+def rebuild_bulk_facets(sender, business, action, product_ids, **kwargs):
+    if action == 'price':
+        facets.sync_price_buckets(product_ids)
+    facets.rebuild_business(business)
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_save, sender=Product)
+def record_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        changefeed.record(instance, ChangeLogEntry.ACTION_UPSERT)
+
+
+@receiver(pre_save, sender=Business)
+def remember_business_visibility(sender, instance, raw=False, **kwargs):
+    instance._public_before = None
+    if instance.pk and not raw:
+        instance._public_before = (Business.objects.filter(pk=instance.pk)
+                                   .values_list('public', flat=True).first())
+
+
+@receiver(post_save, sender=Business)
+def record_visibility_change(sender, instance, created, raw=False, **kwargs):
+    """Publish or withdraw every product when a catalog turns public or private."""
+    before = getattr(instance, '_public_before', None)
+    if not created and not raw and before is not None and before != instance.public:
+        changefeed.record_products(instance.pk, list(instance.products.values_list('pk', flat=True)),
+                                   ChangeLogEntry.ACTION_UPSERT)
+
+
+@receiver(post_delete, sender=Business)
+@receiver(post_delete, sender=Product)
+def record_deletion(sender, instance, **kwargs):
+    if not _in_bulk.get():
+        changefeed.record(instance, ChangeLogEntry.ACTION_DELETE)
+
+
+@receiver(products_bulk_changed)
+def record_bulk_changes(sender, business, action, product_ids, **kwargs):
+    changefeed.record_products(
+        business.pk, product_ids,
+        ChangeLogEntry.ACTION_DELETE if action == 'delete' else ChangeLogEntry.ACTION_UPSERT,
+    )
@@ -0,0 +1,276 @@
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TRANSFORM_PREFIX = '_t'
+CROP_MODES = ('fill', 'fit', 'limit', 'scale')
+# Cloudinary's short transformation keys, as used in its delivery URLs.
+TRANSFORM_KEYS = {'width': 'w', 'height': 'h', 'crop': 'c', 'quality': 'q'}
+# Largest width or height a transformed variant may ask for; anything up
+# to this is rendered and kept on disk for any path, so keep it modest.
+MAX_TRANSFORM_EDGE = 2000
+
+
+def build_transformation(**options):
+    """Turn Cloudinary-style options (width=300, crop='fill') into 'c_fill,w_300'."""
+    parts = []
+    for option, value in sorted(options.items()):
+        if option not in TRANSFORM_KEYS:
+            raise ValueError(f'Unsupported transformation option: {option}')
+        parts.append(f'{TRANSFORM_KEYS[option]}_{value}')
+    return ','.join(parts)
+
+
+def parse_transformation(transformation):
+    """Inverse of build_transformation; raises ValueError on anything unknown."""
+    keys = {short: option for option, short in TRANSFORM_KEYS.items()}
+    options = {}
+    for part in transformation.split(','):
+        short, _, value = part.partition('_')
+        if short not in keys or not value:
+            raise ValueError(f'Invalid transformation: {part}')
+        option = keys[short]
+        if option == 'crop':
+            if value not in CROP_MODES:
+                raise ValueError(f'Invalid crop mode: {value}')
+            options[option] = value
+            continue
+        number = int(value)
+        limit = 100 if option == 'quality' else MAX_TRANSFORM_EDGE
+        if not 1 <= number <= limit:
+            raise ValueError(f'{option} must be between 1 and {limit}: {value}')
+        options[option] = number
+    return options
+
+
+class StorageMetrics:
+    """Per-operation latency counters for the media storage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._ops = {}
+
+    def record(self, op, seconds):
+        with self._lock:
+            count, total, worst = self._ops.get(op, (0, 0.0, 0.0))
+            self._ops[op] = (count + 1, total + seconds, max(worst, seconds))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                op: {'count': count, 'total_ms': total * 1000,
+                     'avg_ms': total * 1000 / count, 'max_ms': worst * 1000}
+                for op, (count, total, worst) in self._ops.items()
+            }
+
+
+metrics = StorageMetrics()
+
+
+@deconstructible
+class LocalMediaStorage(FileSystemStorage):
+    """
+    Disk-backed stand-in for Cloudinary media storage.
+
+    Files live under MEDIA_ROOT and url() accepts the same transformation
+    options as Cloudinary (width, height, crop, quality). Transformed
+    variants are rendered with Pillow on first request and kept on disk
+    next to the original, so offline runs see Cloudinary-like URLs.
+    """
+
+    def url(self, name, **options):
+        if not options:
+            return super().url(name)
+        return super().url(posixpath.join(TRANSFORM_PREFIX, build_transformation(**options), name))
+
+    def transformed_path(self, name, transformation):
+        """Render (once) and return the filesystem path of a transformed variant."""
+        from PIL import Image, ImageOps
+
+        options = parse_transformation(transformation)
+        target = self.path(posixpath.join(TRANSFORM_PREFIX, transformation, name))
+        if os.path.exists(target):
+            return target
+
+        with self.open(name) as source, Image.open(source) as img:
+            fmt = img.format
+            width = options.get('width') or img.width
+            height = options.get('height') or img.height
+            crop = options.get('crop', 'scale')
+            if crop == 'fill':
+                img = ImageOps.fit(img, (width, height))
+            elif crop == 'fit' or (crop == 'limit' and (img.width > width or img.height > height)):
+                img = ImageOps.contain(img, (width, height))
+            elif crop == 'scale':
+                img = img.resize((width, height))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            save_kwargs = {'quality': options['quality']} if 'quality' in options else {}
+            img.save(target, format=fmt, **save_kwargs)
+        return target
+
+
+@deconstructible
+class MediaStorage(Storage):
+    """
+    Default storage for uploaded media.
+
+    Wraps the backend named by MEDIA_STORAGE_BACKEND, records latency for
+    every operation in ``metrics`` and, with MEDIA_STORAGE_BACKGROUND_WRITES,
+    stages uploads on local disk and hands the backend write to a worker
+    thread so the request does not wait on it.
+
+    Staged files are only known to the process that staged them: until the
+    write finishes, other workers see the file as missing (a 404 for its
+    URL). A failed write is retried MEDIA_STORAGE_WRITE_RETRIES times and
+    the staged copy is kept if it never succeeds, or if another file with
+    different content took the name in the meantime.
+    """
+
+    def __init__(self, backend=None, background_writes=None):
+        self.backend_path = backend or settings.MEDIA_STORAGE_BACKEND
+        self.backend = import_string(self.backend_path)()
+        if background_writes is None:
+            background_writes = getattr(settings, 'MEDIA_STORAGE_BACKGROUND_WRITES', False)
+        self.background_writes = background_writes
+        self._staged = {}
+        self._staged_lock = threading.Lock()
+
+    @contextmanager
+    def _timed(self, op, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.record(op, elapsed)
+            if elapsed * 1000 >= getattr(settings, 'MEDIA_STORAGE_SLOW_MS', 500):
+                logger.warning('Slow storage %s for %s: %.1fms', op, name, elapsed * 1000)
+
+    def _staged_path(self, name):
+        with self._staged_lock:
+            return self._staged.get(name)
+
+    def _open(self, name, mode='rb'):
+        staged = self._staged_path(name)
+        if staged:
+            return File(open(staged, mode), name=name)
+        with self._timed('open', name):
+            return self.backend.open(name, mode)
+
+    def _save(self, name, content):
+        if not self.background_writes:
+            with self._timed('save', name):
+                return self.backend.save(name, content)
+
+        # Copy the upload chunk by chunk to a staging file that outlives the
+        # request; the backend write happens on the background pool.
+        fd, staged = tempfile.mkstemp(dir=settings.FILE_UPLOAD_TEMP_DIR, prefix='katlo-media-')
+        with os.fdopen(fd, 'wb') as out:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                out.write(chunk)
+        with self._staged_lock:
+            self._staged[name] = staged
+
+        from .tasks import run_in_background
+        run_in_background(self._flush, name, staged)
+        return name
+
+    def _flush(self, name, staged):
+        # The model row already points at name, so the staged copy is the
+        # only one until the backend has it: keep it until a save succeeds.
+        retries = getattr(settings, 'MEDIA_STORAGE_WRITE_RETRIES', 5)
+        for attempt in range(retries + 1):
+            try:
+                with open(staged, 'rb') as fh, self._timed('save', name):
+                    saved = self.backend.save(name, File(fh, name=name))
+            except Exception:
+                if attempt == retries:
+                    logger.exception('Background write of %s failed %d times; staged copy kept at %s',
+                                     name, attempt + 1, staged)
+                    return
+                logger.warning('Background write of %s failed, retrying', name, exc_info=True)
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            if saved != name:
+                # Something else wrote name while this was queued, so the
+                # backend picked a free name the row does not point at.
+                self.backend.delete(saved)
+                if not self._holds(name, staged):
+                    logger.error('Background write of %s found different content there; staged copy kept at %s',
+                                 name, staged)
+                    return
+            with self._staged_lock:
+                self._staged.pop(name, None)
+            os.remove(staged)
+            return
+
+    def _holds(self, name, staged):
+        # Content-addressed names hold the same bytes whoever wrote them.
+        digests = []
+        for fh in (self.backend.open(name, 'rb'), open(staged, 'rb')):
+            hasher = hashlib.sha256()
+            with fh:
+                for chunk in iter(lambda: fh.read(64 * 1024), b''):
+                    hasher.update(chunk)
+            digests.append(hasher.digest())
+        return digests[0] == digests[1]
+
+    def get_available_name(self, name, max_length=None):
+        if self._staged_path(name):
+            return super().get_available_name(name, max_length)
+        return self.backend.get_available_name(name, max_length)
+
+    def delete(self, name):
+        with self._timed('delete', name):
+            return self.backend.delete(name)
+
+    def exists(self, name):
+        if self._staged_path(name):
+            return True
+        with self._timed('exists', name):
+            return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+    def size(self, name):
+        staged = self._staged_path(name)
+        if staged:
+            return os.path.getsize(staged)
+        with self._timed('size', name):
+            return self.backend.size(name)
+
+    def url(self, name, **options):
+        if not options:
+            return self.backend.url(name)
+        if isinstance(self.backend, LocalMediaStorage):
+            return self.backend.url(name, **options)
+        if self.backend_path.startswith('cloudinary_storage.'):
+            import cloudinary
+            return cloudinary.CloudinaryImage(self.backend._prepend_prefix(name)).build_url(**options)
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
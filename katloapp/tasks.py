@@ -0,0 +1,47 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'BACKGROUND_TASK_WORKERS', 2)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='katlo-task')
+        return _executor
+
+
+def _log_failure(future):
+    _pending.discard(future)
+    exc = future.exception()
+    if exc is not None:
+        logger.error('Background task failed', exc_info=exc)
+
+
+def run_in_background(fn, *args, **kwargs):
+    """Run fn on the shared worker pool and return its future."""
+    future = _get_executor().submit(fn, *args, **kwargs)
+    _pending.add(future)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def wait_for_background_tasks(timeout=None):
+    """Block until every queued task has finished (used by tests and shutdown)."""
+    return wait(list(_pending), timeout=timeout)
+
+
+@atexit.register
+def _shutdown():
+    if _executor is not None:
+        _executor.shutdown(wait=True)
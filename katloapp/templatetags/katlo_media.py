@@ -0,0 +1,18 @@
+from django import template
+
+from ..storage import MediaStorage, parse_transformation
+
+register = template.Library()
+
+
+@register.filter
+def transformed(image, transformation):
+    """
+    URL of an image with a Cloudinary-style transformation applied, e.g.
+    {{ product.image|transformed:"w_96,h_96,c_fill" }}.
+    """
+    if not image:
+        return ''
+    if isinstance(image.storage, MediaStorage):
+        return image.storage.url(image.name, **parse_transformation(transformation))
+    return image.url
@@ -0,0 +1,358 @@
+import io
+import tempfile
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from .bulk import apply_bulk_action
+from .changefeed import business_version
+from .facets import price_bucket
+from .models import Business, CatalogFacet, ChangeLogEntry, ImageBlob, Product, ScrapeLog, WhatsAppCatalogue
+from .ratelimit import CacheBucketStore, get_store
+from .routers import PRIMARY_ALIAS, REPLICA_ALIAS, PrimaryReplicaRouter, read_from_replica
+from .scraper import WhatsAppCatalogueScraper
+from .storage import MediaStorage
+from .tasks import wait_for_background_tasks
+
+TESTDATA = Path(__file__).resolve().parent / 'testdata'
+
+
+class DashboardQueryCountTests(TestCase):
+    """The signed-in pages load the user and their business together."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('shopkeeper', password='secret')
+        business = Business.objects.create(user=cls.user, name='Corner Shop', whatsapp_number='+910000000000',
+                                           description='Everyday goods.')
+        for i in range(3):
+            Product.objects.create(business=business, name=f'Product {i}')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_dashboard(self):
+        # The session, the user joined to their business, then the products.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('katloapp:dashboard'))
+        self.assertEqual(len(response.context['products']), 3)
+
+    def test_product_list(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('katloapp:product_list'))
+        self.assertEqual(len(response.context['products']), 3)
+
+
+def png_upload(color='red'):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProductImageTests(TestCase):
+    """Products share stored images and release them when done."""
+
+    def setUp(self):
+        self.business = Business.objects.create(name='Corner Shop', whatsapp_number='+910000000000')
+
+    def test_reuploading_the_same_image_keeps_one_reference(self):
+        product = Product.objects.create(business=self.business, name='Mug', image=png_upload())
+        for _ in range(2):
+            product.image = png_upload()
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 1)
+        storage = blob.file.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(storage.exists(blob.file.name))
+
+    def test_replacing_the_image_releases_the_old_one(self):
+        product = Product.objects.create(business=self.business, name='Mug', image=png_upload('red'))
+        product.image = png_upload('blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(ImageBlob.objects.get().pk, product.image_blob_id)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BulkActionTests(TestCase):
+    """Bulk actions keep images, facets and the change log in step once per batch."""
+
+    def setUp(self):
+        self.business = Business.objects.create(name='Corner Shop', whatsapp_number='+910000000000')
+        self.mug = Product.objects.create(business=self.business, name='Mug', price=Decimal('400'))
+        self.cap = Product.objects.create(business=self.business, name='Cap', price=Decimal('400'))
+
+    def test_price_change_rebuckets_only_the_selection(self):
+        Product.objects.filter(pk=self.cap.pk).update(price_bucket='stale')
+        apply_bulk_action(self.business, self.business.products.filter(pk=self.mug.pk), 'price', percent=200)
+        self.mug.refresh_from_db()
+        self.assertEqual(self.mug.price_bucket, price_bucket(Decimal('1200')))
+        self.assertEqual(Product.objects.get(pk=self.cap.pk).price_bucket, 'stale')
+        self.assertEqual(set(CatalogFacet.objects.values_list('price_bucket', 'product_count')),
+                         {(price_bucket(Decimal('400')), 1), (price_bucket(Decimal('1200')), 1)})
+
+    def test_delete(self):
+        for product in (self.mug, self.cap):
+            product.image = png_upload()
+            product.save()
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            count = apply_bulk_action(self.business, self.business.products.all(), 'delete')
+        self.assertEqual(count, 2)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(CatalogFacet.objects.exists())
+        tombstones = ChangeLogEntry.objects.filter(object_type='product', action=ChangeLogEntry.ACTION_DELETE)
+        self.assertEqual(sorted(tombstones.values_list('object_id', flat=True)), [self.mug.pk, self.cap.pk])
+
+
+@override_settings(MEDIA_STORAGE_BACKEND='katloapp.storage.LocalMediaStorage')
+class BackgroundWriteTests(TestCase):
+    """Staged uploads reach the backend under the name the row points at."""
+
+    def setUp(self):
+        self.enterContext(self.settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        self.storage = MediaStorage(background_writes=True)
+
+    def stage(self, name, content):
+        fd, staged = tempfile.mkstemp(prefix='katlo-media-')
+        with open(fd, 'wb') as out:
+            out.write(content)
+        self.storage._staged[name] = staged
+        return staged
+
+    def test_write_reaches_the_backend(self):
+        name = self.storage.save('products/ab/mug.png', ContentFile(b'mug'))
+        self.assertTrue(self.storage.exists(name))
+        wait_for_background_tasks(timeout=5)
+        self.assertEqual(self.storage._staged, {})
+        with self.storage.backend.open(name) as fh:
+            self.assertEqual(fh.read(), b'mug')
+
+    def test_name_taken_with_the_same_content(self):
+        self.storage.backend.save('products/ab/mug.png', ContentFile(b'mug'))
+        staged = self.stage('products/ab/mug.png', b'mug')
+        self.storage._flush('products/ab/mug.png', staged)
+        self.assertEqual(self.storage.backend.listdir('products/ab'), ([], ['mug.png']))
+        self.assertFalse(Path(staged).exists())
+
+    def test_name_taken_with_other_content_keeps_the_staged_copy(self):
+        self.storage.backend.save('products/ab/mug.png', ContentFile(b'cup'))
+        staged = self.stage('products/ab/mug.png', b'mug')
+        with self.assertLogs('katloapp.storage', 'ERROR'):
+            self.storage._flush('products/ab/mug.png', staged)
+        self.assertEqual(self.storage.backend.listdir('products/ab'), ([], ['mug.png']))
+        with self.storage.open('products/ab/mug.png') as fh:
+            self.assertEqual(fh.read(), b'mug')
+        Path(staged).unlink()
+
+
+class ChangeFeedTests(TestCase):
+    """Only public catalogs are published to mirrors."""
+
+    def latest(self, obj):
+        return ChangeLogEntry.objects.filter(object_type=obj._meta.model_name, object_id=obj.pk).last()
+
+    def test_private_catalog_is_logged_as_deleted(self):
+        business = Business.objects.create(name='Hidden', whatsapp_number='+910000000000', public=False)
+        product = Product.objects.create(business=business, name='Secret')
+        for obj in (business, product):
+            entry = self.latest(obj)
+            self.assertEqual((entry.action, entry.data), (ChangeLogEntry.ACTION_DELETE, None))
+
+    def test_visibility_change_publishes_and_withdraws_products(self):
+        business = Business.objects.create(name='Shop', whatsapp_number='+910000000000', public=False)
+        product = Product.objects.create(business=business, name='Mug')
+        business.public = True
+        business.save()
+        self.assertEqual(self.latest(product).data['name'], 'Mug')
+        business.public = False
+        business.save()
+        self.assertEqual(self.latest(product).action, ChangeLogEntry.ACTION_DELETE)
+        self.assertEqual(self.latest(business).action, ChangeLogEntry.ACTION_DELETE)
+
+
+class PageCacheTests(TestCase):
+    """Each public catalog is cached until its own catalog changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.shop = Business.objects.create(name='Shop', whatsapp_number='+910000000000')
+        self.other = Business.objects.create(name='Other', whatsapp_number='+910000000001')
+        self.mug = Product.objects.create(business=self.shop, name='Clay Mug')
+
+    def test_version_follows_only_its_own_catalog(self):
+        version = business_version(self.shop.slug)
+        Product.objects.create(business=self.other, name='Teapot')
+        self.assertEqual(business_version(self.shop.slug), version)
+        self.mug.delete()
+        self.assertNotEqual(business_version(self.shop.slug), version)
+        self.assertIsNone(business_version('no-such-shop'))
+
+    def test_catalog_page_is_rerendered_after_its_products_change(self):
+        url = self.shop.get_public_url()
+        self.assertContains(self.client.get(url), 'Clay Mug')
+        Product.objects.create(business=self.shop, name='Tea Cup')
+        self.assertContains(self.client.get(url), 'Tea Cup')
+
+
+class ReplicaRoutingTests(TestCase):
+
+    @mock.patch('katloapp.routers.replica_configured', return_value=True)
+    def test_only_catalog_reads_go_to_the_replica(self, configured):
+        router = PrimaryReplicaRouter()
+        view = read_from_replica(lambda request, model: router.db_for_read(model))
+        request = RequestFactory().get('/')
+        for model in (Business, Product):
+            self.assertEqual(view(request, model), REPLICA_ALIAS)
+        for model in (Session, get_user_model()):
+            self.assertEqual(view(request, model), PRIMARY_ALIAS)
+        self.assertEqual(router.db_for_read(Product), PRIMARY_ALIAS)
+
+
+class AuthenticationTests(TestCase):
+
+    def test_failed_login_hashes_once(self):
+        get_user_model().objects.create_user('shopkeeper', password='secret')
+        encode = PBKDF2PasswordHasher.encode
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode', autospec=True, side_effect=encode) as hashed:
+            self.assertIsNone(authenticate(username='shopkeeper', password='wrong'))
+            self.assertIsNone(authenticate(username='nobody', password='wrong'))
+        # One hash per attempt: for the wrong password, and for the unknown
+        # user to take as long as a known one.
+        self.assertEqual(hashed.call_count, 2)
+
+
+@mock.patch('katloapp.views.authenticate', return_value=None)
+class LoginRateLimitTests(TestCase):
+    """Failed logins are throttled per client without locking the account."""
+
+    def setUp(self):
+        get_store().clear()
+
+    def attempt(self, ip):
+        return self.client.post(reverse('katloapp:business_login'),
+                                {'username': 'shopkeeper', 'password': 'wrong'}, REMOTE_ADDR=ip)
+
+    def test_one_client_is_throttled(self, authenticate):
+        for _ in range(6):
+            response = self.attempt('203.0.113.7')
+        self.assertEqual(authenticate.call_count, 5)
+        self.assertIn('Retry-After', response)
+
+    def test_other_clients_can_still_log_in(self, authenticate):
+        for _ in range(6):
+            self.attempt('203.0.113.7')
+        self.attempt('198.51.100.20')
+        self.assertEqual(authenticate.call_count, 6)
+
+
+class CacheBucketStoreTests(TestCase):
+
+    def test_clear_only_resets_buckets(self):
+        store = CacheBucketStore('default')
+        cache.set('page:1:home', 'cached page')
+        for _ in range(2):
+            store.consume('rl:login:ip:abc', 2, 1 / 60)
+        self.assertTrue(store.consume('rl:login:ip:abc', 2, 1 / 60))
+        store.clear()
+        self.assertEqual(store.consume('rl:login:ip:abc', 2, 1 / 60), 0)
+        self.assertEqual(cache.get('page:1:home'), 'cached page')
+
+
+class CatalogueHandler(BaseHTTPRequestHandler):
+    """Serves testdata/catalogue.html with an ETag, and 304 when it matches."""
+    etag = '"catalogue-v1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.path != '/catalogue':
+            self.send_error(404)
+        elif self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            body = (TESTDATA / 'catalogue.html').read_bytes()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', self.etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ScraperTests(TestCase):
+    """Scrapes a fixture page from a local HTTP server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), CatalogueHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        CatalogueHandler.requests = []
+        self.business = Business.objects.create(name='Corner Shop', whatsapp_number='+910000000000')
+        self.catalogue = WhatsAppCatalogue.objects.create(business=self.business, name='Shop',
+                                                          url=f'{self.base_url}/catalogue')
+
+    def scrape(self, *catalogues):
+        scraper = WhatsAppCatalogueScraper(workers=2, rate_limit=0, timeout=5)
+        return scraper.scrape(WhatsAppCatalogue.objects.filter(pk__in=[c.pk for c in catalogues])
+                              .select_related('business'))
+
+    def test_imports_json_ld_products(self):
+        Product.objects.create(business=self.business, name='Old mug', sku='MUG-1', price=Decimal('150'))
+        [log] = self.scrape(self.catalogue)
+        self.assertEqual(log.status, ScrapeLog.STATUS_SUCCESS)
+        self.assertEqual((log.products_found, log.products_added, log.products_updated), (2, 1, 1))
+        mug = self.business.products.get(sku='MUG-1')
+        self.assertEqual((mug.name, mug.price), ('Clay Mug', Decimal('199.50')))
+        cap = self.business.products.get(name='Cotton Cap')
+        self.assertEqual((cap.price, cap.price_bucket, cap.public), (Decimal('1200'), price_bucket(cap.price), True))
+        self.catalogue.refresh_from_db()
+        self.assertEqual(self.catalogue.etag, CatalogueHandler.etag)
+
+    def test_unchanged_page_is_not_reimported(self):
+        self.scrape(self.catalogue)
+        [log] = self.scrape(self.catalogue)
+        self.assertEqual(log.status, ScrapeLog.STATUS_NOT_MODIFIED)
+        self.assertEqual(CatalogueHandler.requests[-1], ('/catalogue', CatalogueHandler.etag))
+        self.assertEqual(self.business.products.count(), 2)
+
+    def test_unreachable_page_fails(self):
+        missing = WhatsAppCatalogue.objects.create(business=self.business, name='Gone',
+                                                   url=f'{self.base_url}/missing')
+        with self.assertLogs('katloapp.scraper', 'WARNING'):
+            [log] = self.scrape(missing)
+        self.assertEqual(log.status, ScrapeLog.STATUS_FAILED)
+        self.assertFalse(self.business.products.exists())
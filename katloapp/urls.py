@@ -1,11 +1,14 @@
 from django.urls import path
-from . import views
+from . import debug, views
 
 app_name = "katloapp"
 
 urlpatterns = [
     path('', views.public_home, name='public_home'),
     path('catalogs/', views.catalog_list, name='catalog_list'), 
+    path('discover/', views.discover, name='discover'),
+    path('api/discover/', views.discover_api, name='discover_api'),
+    path('api/changes/', views.change_feed, name='change_feed'),
 
     # Business Auth
     path('business/login/', views.business_login, name='business_login'),
@@ -21,6 +24,7 @@ urlpatterns = [
     path('product/create/', views.product_create, name='product_create'),
     path('product/<int:pk>/edit/', views.product_edit, name='product_edit'),
     path('product/<int:pk>/delete/', views.product_delete, name='product_delete'),
+    path('products/bulk/', views.product_bulk_action, name='product_bulk_action'),
 
     # Public Catalog
     path('catalog/<slug:slug>/', views.public_catalog, name='public_catalog'),
@@ -28,4 +32,6 @@ urlpatterns = [
     
     # Admin helpers
     path('admin-logout/', views.admin_logout_redirect, name='admin_logout_redirect'),
+    path('admin-tools/catalogues/<int:catalogue_id>/debug/', debug.debug_catalogue_url, name='debug_catalogue_url'),
+    path('admin-tools/catalogues/<int:catalogue_id>/sample/', debug.test_sample_data, name='test_sample_data'),
 ]
\ No newline at end of file
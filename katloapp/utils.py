@@ -1,12 +1,23 @@
-import qrcode
 import io
+import hashlib
+import os
 from urllib.parse import quote_plus
 
+# qrcode and Pillow are imported inside the functions that need them so
+# worker start-up and most requests never load them.
+
+# Formats we accept for product images, mapped to the stored file extension.
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+
 def build_whatsapp_link(number: str, message: str):
     clean = number.replace('+','').replace(' ','')
     return f"https://wa.me/{clean}?text={quote_plus(message)}"
 
 def generate_qr_image_bytes(target_url: str):
+    import qrcode
+
     qr = qrcode.QRCode(version=1, box_size=8, border=2)
     qr.add_data(target_url)
     qr.make(fit=True)
@@ -14,4 +25,49 @@ def generate_qr_image_bytes(target_url: str):
     buf = io.BytesIO()
     img.save(buf, format='PNG')
     buf.seek(0)
-    return buf
\ No newline at end of file
+    return buf
+
+def file_sha256(f):
+    """SHA-256 of an uploaded file, reusing the digest computed while streaming."""
+    digest = getattr(f, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in f.chunks():
+        hasher.update(chunk)
+    f.seek(0)
+    f.sha256 = hasher.hexdigest()
+    return f.sha256
+
+def sniff_image(f, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Read only the image header and return (format, width, height).
+
+    Raises ValueError for unsupported formats or images whose pixel count
+    exceeds max_pixels; nothing is decoded beyond the header.
+    """
+    from PIL import Image
+
+    f.seek(0)
+    try:
+        with Image.open(f) as img:
+            fmt, (width, height) = img.format, img.size
+    except Image.DecompressionBombError:
+        raise ValueError('Image dimensions are too large.')
+    except Exception:
+        raise ValueError('Please upload a valid image file.')
+    finally:
+        f.seek(0)
+    if fmt not in IMAGE_EXTENSIONS:
+        raise ValueError('Unsupported image format. Use JPEG, PNG, WEBP or GIF.')
+    if width * height > max_pixels:
+        raise ValueError('Image dimensions are too large.')
+    return fmt, width, height
+
+def image_extension(f):
+    """File extension for a validated upload, falling back to its name."""
+    fmt = getattr(f, 'image_format', None)
+    if fmt in IMAGE_EXTENSIONS:
+        return IMAGE_EXTENSIONS[fmt]
+    ext = os.path.splitext(f.name or '')[1].lstrip('.').lower()
+    return ext or 'bin'
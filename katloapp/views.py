@@ -1,17 +1,40 @@
+import hmac
+import json
+from collections import namedtuple
+from itertools import islice
+from urllib.parse import quote_plus
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import get_template, render_to_string
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, Http404
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import UserCreationForm
 from django.db.models import Q
-from django.views.decorators.http import require_http_methods
+from django.db.models.functions import Substr
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_http_methods, require_POST
 
 from .models import Business, Product
-from .forms import BusinessForm, ProductForm
+from . import changefeed
+from .bulk import apply_bulk_action
+from .decorators import business_required, get_request_business
+from .facets import PRICE_BUCKET_LABELS, discover_page, encode_cursor, facet_counts
+from .forms import BulkProductActionForm, BusinessForm, ProductForm
+from .pagecache import cache_public_page
+from .ratelimit import rate_limit
+from .routers import read_from_replica
+from .storage import LocalMediaStorage
 from .utils import build_whatsapp_link, generate_qr_image_bytes
 
 
+@read_from_replica
 def public_home(request):
     """Public homepage showing statistics."""
     total_catalogues = Business.objects.filter(public=True).count()
@@ -24,12 +47,120 @@ def public_home(request):
     return render(request, 'katloapp/public_home.html', context)
 
 
+@read_from_replica
+@cache_public_page
 def catalog_list(request):
     """A new page to display all public business catalogs."""
     businesses = Business.objects.filter(public=True).order_by('-created_at')
     return render(request, 'katloapp/catalog_list.html', {'businesses': businesses})
 
 
+DISCOVER_PAGE_SIZE = 24
+
+
+def _discover_results(request):
+    """Facet counts and one page of products for the discovery filters in the query string."""
+    filters = {
+        'city': request.GET.get('city', ''),
+        'native_place': request.GET.get('native_place', ''),
+        'price_bucket': request.GET.get('price', ''),
+    }
+    if filters['price_bucket'] not in PRICE_BUCKET_LABELS:
+        filters['price_bucket'] = ''
+
+    # The total comes from the facet table, so paging never COUNTs products
+    total, facets = facet_counts(filters)
+    num_pages = max(1, -(-total // DISCOVER_PAGE_SIZE))
+    try:
+        page = min(max(1, int(request.GET.get('page', 1))), num_pages)
+        products, has_previous, has_next = discover_page(
+            filters, after=request.GET.get('after'), before=request.GET.get('before'),
+            size=DISCOVER_PAGE_SIZE)
+    except ValueError:
+        page = 1
+        products, has_previous, has_next = discover_page(filters, size=DISCOVER_PAGE_SIZE)
+    return {
+        'filters': filters,
+        'total': total,
+        'facets': facets,
+        'products': products,
+        'page': page,
+        'num_pages': num_pages,
+        # Keyset cursors for the neighbouring pages; page only numbers them.
+        'previous_cursor': encode_cursor(products[0]) if has_previous and products else None,
+        'next_cursor': encode_cursor(products[-1]) if has_next and products else None,
+    }
+
+
+@read_from_replica
+def discover(request):
+    """Browse products across all public catalogs, faceted by city, native place and price."""
+    results = _discover_results(request)
+    params = {'city': results['filters']['city'],
+              'native_place': results['filters']['native_place'],
+              'price': results['filters']['price_bucket']}
+
+    def link(**changes):
+        query = {k: v for k, v in {**params, **changes}.items() if v}
+        return '?' + urlencode(query) if query else request.path
+
+    facet_groups = []
+    for field, title, param in (('city', 'City', 'city'),
+                                ('native_place', 'Native place', 'native_place'),
+                                ('price_bucket', 'Price', 'price')):
+        selected = params[param]
+        facet_groups.append({
+            'title': title,
+            'clear_url': link(**{param: ''}) if selected else None,
+            'values': [
+                {
+                    'label': PRICE_BUCKET_LABELS.get(value, value) if field == 'price_bucket' else value,
+                    'count': count,
+                    'selected': value == selected,
+                    'url': link(**{param: '' if value == selected else value}),
+                }
+                for value, count in results['facets'][field]
+            ],
+        })
+    results['facet_groups'] = facet_groups
+    results['prev_url'] = results['next_url'] = None
+    if results['previous_cursor']:
+        page = results['page'] - 1
+        results['prev_url'] = link(page=page, before=results['previous_cursor']) if page > 1 else link()
+    if results['next_cursor']:
+        results['next_url'] = link(page=results['page'] + 1, after=results['next_cursor'])
+    return render(request, 'katloapp/discover.html', results)
+
+
+@read_from_replica
+def discover_api(request):
+    """JSON version of the discovery page."""
+    results = _discover_results(request)
+    return JsonResponse({
+        'total': results['total'],
+        'page': results['page'],
+        'num_pages': results['num_pages'],
+        'previous_cursor': results['previous_cursor'],
+        'next_cursor': results['next_cursor'],
+        'facets': {
+            field: [{'value': value, 'count': count} for value, count in rows]
+            for field, rows in results['facets'].items()
+        },
+        'products': [
+            {
+                'id': product.pk,
+                'name': product.name,
+                'price': str(product.price) if product.price is not None else None,
+                'image': product.image.url if product.image else None,
+                'business': product.business.name,
+                'catalog_url': request.build_absolute_uri(product.business.get_public_url()),
+            }
+            for product in results['products']
+        ],
+    })
+
+
+@rate_limit('login')
 def business_login(request):
     """Business login view"""
     if request.user.is_authenticated:
@@ -53,6 +184,7 @@ def business_login(request):
     return render(request, 'katloapp/business_login.html')
 
 
+@rate_limit('register')
 def business_register(request):
     """Business registration view"""
     if request.user.is_authenticated:
@@ -101,14 +233,8 @@ def admin_logout_redirect(request):
 @login_required
 def dashboard(request):
     """Main business dashboard"""
-    try:
-        business = request.user.business
-    except Business.DoesNotExist:
-        # Create business if it doesn't exist
-        business = Business.objects.create(
-            user=request.user,
-            name=request.user.get_full_name() or f"{request.user.username}'s Business"
-        )
+    # Create business if it doesn't exist
+    business = get_request_business(request, create=True)
     
     products = business.products.filter(active=True).order_by('-created_at')
     
@@ -130,13 +256,7 @@ def dashboard(request):
 @login_required
 def business_edit(request):
     """Edit business information"""
-    try:
-        business = request.user.business
-    except Business.DoesNotExist:
-        business = Business.objects.create(
-            user=request.user,
-            name=request.user.get_full_name() or f"{request.user.username}'s Business"
-        )
+    business = get_request_business(request, create=True)
     
     if request.method == 'POST':
         form = BusinessForm(request.POST, instance=business)
@@ -152,19 +272,8 @@ def business_edit(request):
     return render(request, 'katloapp/business_form.html', {'form': form, 'business': business})
 
 
-@login_required
-def product_list(request):
-    """List all products for the logged-in business"""
-    try:
-        business = request.user.business
-    except Business.DoesNotExist:
-        messages.error(request, 'Please complete your business profile first.')
-        return redirect('katloapp:business_edit')
-    
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    products = business.products.all()
-    
+def filter_products(products, search_query, status_filter):
+    """Apply the product list's search and status filters to a queryset"""
     if search_query:
         products = products.filter(
             Q(name__icontains=search_query) | 
@@ -172,31 +281,69 @@ def product_list(request):
             Q(sku__icontains=search_query)
         )
     
-    # Status filter
-    status_filter = request.GET.get('status', 'all')
     if status_filter == 'active':
         products = products.filter(active=True)
     elif status_filter == 'inactive':
         products = products.filter(active=False)
+    return products
+
+
+@business_required
+def product_list(request, business):
+    """List all products for the logged-in business"""
+    search_query = request.GET.get('search', '')
+    status_filter = request.GET.get('status', 'all')
+    products = filter_products(business.products.all(), search_query, status_filter)
     
     products = products.order_by('-created_at')
     
     return render(request, 'katloapp/product_list.html', {
         'products': products,
         'search_query': search_query,
-        'status_filter': status_filter
+        'status_filter': status_filter,
+        'bulk_form': BulkProductActionForm(),
     })
 
 
-@login_required
-def product_create(request):
+@business_required
+@require_POST
+def product_bulk_action(request, business):
+    """Apply one action to the selected products, or to every product matching the current filters"""
+    search_query = request.POST.get('search', '')
+    status_filter = request.POST.get('status', 'all')
+    list_url = reverse('katloapp:product_list')
+    if search_query or status_filter != 'all':
+        list_url += '?' + urlencode({'search': search_query, 'status': status_filter})
+
+    form = BulkProductActionForm(request.POST)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect(list_url)
+
+    products = business.products.all()
+    if form.cleaned_data['select_all']:
+        products = filter_products(products, search_query, status_filter)
+    else:
+        ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+        if not ids:
+            messages.error(request, 'Select at least one product.')
+            return redirect(list_url)
+        products = products.filter(pk__in=ids)
+
+    action = form.cleaned_data['action']
+    count = apply_bulk_action(business, products, action, form.cleaned_data['percent'])
+    if action == 'delete':
+        messages.success(request, f'{count} product(s) deleted successfully!')
+    else:
+        messages.success(request, f'{count} product(s) updated successfully!')
+    return redirect(list_url)
+
+
+@business_required
+def product_create(request, business):
     """Create a new product"""
-    try:
-        business = request.user.business
-    except Business.DoesNotExist:
-        messages.error(request, 'Please complete your business profile first.')
-        return redirect('katloapp:business_edit')
-    
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES)
         if form.is_valid():
@@ -253,42 +400,98 @@ def product_delete(request, pk):
     return render(request, 'katloapp/product_confirm_delete.html', {'product': product})
 
 
+# Only the start of each description is rendered; the card clamps it to
+# three lines.
+DESCRIPTION_PREVIEW_CHARS = 300
+# Product cards rendered per chunk of a streamed public catalog.
+PRODUCT_CARDS_CHUNK = 100
+PRODUCT_CARDS_MARKER = mark_safe('<!-- product cards -->')
+
+# What product_cards.html needs of a product, without a model instance.
+CatalogProduct = namedtuple('CatalogProduct', 'name price description image_url whatsapp_link')
+
+
+def catalog_rows(business, catalog_url):
+    """
+    An iterator of CatalogProduct for each active product of business,
+    newest first, fetching only the columns the public catalog renders.
+    """
+    storage = Product._meta.get_field('image').storage
+    link_prefix = link_suffix = None
+    if business.whatsapp_number:
+        # quote_plus works character by character, so the fixed parts of
+        # every product's message are quoted once here.
+        link_prefix = build_whatsapp_link(
+            business.whatsapp_number,
+            f"Hi {business.name}, I'm interested in your product: *",
+        )
+        link_suffix = quote_plus(f"*.\n\nSeen on your Katlo catalog: {catalog_url}")
+
+    # Read from the database the business came from: the rows are fetched
+    # while the response streams, after read_from_replica has returned.
+    rows = (business.products.using(business._state.db).filter(active=True).order_by('-created_at')
+            .values_list('name', 'price', Substr('description', 1, DESCRIPTION_PREVIEW_CHARS + 1), 'image'))
+    for name, price, description, image in rows.iterator():
+        if len(description) > DESCRIPTION_PREVIEW_CHARS:
+            description = description[:DESCRIPTION_PREVIEW_CHARS].rstrip() + '…'
+        yield CatalogProduct(
+            name=name,
+            price=price,
+            description=description,
+            image_url=storage.url(image) if image else '',
+            whatsapp_link=f"{link_prefix}{quote_plus(name)}{link_suffix}" if link_prefix else '',
+        )
+
+
+def _stream_catalog_page(request, context, rows):
+    """
+    Render public_catalog.html around its product cards and stream it,
+    rendering the cards a chunk at a time so neither the products nor the
+    page are ever held in memory whole.
+    """
+    page = render_to_string('katloapp/public_catalog.html',
+                            {**context, 'product_cards': PRODUCT_CARDS_MARKER}, request)
+    head, _, tail = page.partition(PRODUCT_CARDS_MARKER)
+    cards = get_template('katloapp/product_cards.html')
+
+    def chunks():
+        yield head
+        while batch := list(islice(rows, PRODUCT_CARDS_CHUNK)):
+            yield cards.render({'products': batch})
+        yield tail
+
+    return StreamingHttpResponse(chunks(), content_type='text/html; charset=utf-8')
+
+
+def _business_version(request, slug):
+    return changefeed.business_version(slug)
+
+
+@read_from_replica
+@cache_public_page(version=_business_version)
 def public_catalog(request, slug):
     """Public catalog view for customers"""
     business = get_object_or_404(Business, slug=slug, public=True)
-    products = business.products.filter(active=True).order_by('-created_at')
     
     # Get the absolute URL for the catalog
     catalog_url = request.build_absolute_uri(business.get_public_url())
 
-    products_with_links = []
-    if business.whatsapp_number:
-        for product in products:
-            message = (
-                f"Hi {business.name}, I'm interested in your product: *{product.name}*.\n\n"
-                f"Seen on your Katlo catalog: {catalog_url}"
-            )
-            product.whatsapp_link = build_whatsapp_link(business.whatsapp_number, message)
-            products_with_links.append(product)
-    else:
-        products_with_links = products
-
     # Build a general WhatsApp link for the business
     general_message = f"Hi! I found your business '{business.name}' via Katlo and would like to know more. {catalog_url}"
     wa_link = build_whatsapp_link(business.whatsapp_number, general_message) if business.whatsapp_number else None
     
     context = {
         'business': business, 
-        'products': products_with_links, 
         'wa_link': wa_link,
         'catalog_url': catalog_url,
-        'product_count': products.count()
+        'product_count': business.products.filter(active=True).count()
     }
     
-    return render(request, 'katloapp/public_catalog.html', context)
+    return _stream_catalog_page(request, context, catalog_rows(business, catalog_url))
 
 
 @login_required
+@rate_limit('download_qr', methods=('GET', 'POST'), redirect_to='katloapp:dashboard')
 def download_qr(request, slug):
     """Download QR code for WhatsApp catalog link"""
     business = get_object_or_404(Business, slug=slug, user=request.user)
@@ -313,4 +516,59 @@ def download_qr(request, slug):
         
     except Exception as e:
         messages.error(request, 'Error generating QR code. Please try again.')
-        return redirect('katloapp:dashboard')
\ No newline at end of file
+        return redirect('katloapp:dashboard')
+
+
+def media_transform(request, transformation, path):
+    """Serve a Cloudinary-style transformed image from local media storage"""
+    backend = getattr(default_storage, 'backend', default_storage)
+    if not isinstance(backend, LocalMediaStorage):
+        raise Http404
+    try:
+        target = backend.transformed_path(path, transformation)
+    except (ValueError, OSError, SuspiciousFileOperation):
+        raise Http404
+    return FileResponse(open(target, 'rb'))
+
+
+def _is_feed_partner(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and any(
+        hmac.compare_digest(token, allowed) for allowed in settings.CHANGE_FEED_TOKENS
+    )
+
+
+def change_feed(request):
+    """Stream catalog changes after ?since=<seq> for partner mirrors"""
+    if not _is_feed_partner(request):
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = max(1, min(int(request.GET.get('limit', 5000)), 50000))
+    except ValueError:
+        return JsonResponse({'error': 'since and limit must be integers.'}, status=400)
+
+    # Tombstones below the floor were compacted away, so an older cursor
+    # cannot be brought up to date with deltas alone.
+    floor = changefeed.resync_floor()
+    if 0 < since < floor:
+        return JsonResponse({'error': 'Cursor too old; resync from since=0.',
+                             'resync_required': True, 'min_since': floor}, status=410)
+
+    def stream():
+        last, count = since, 0
+        yield '{"changes": ['
+        for entry in changefeed.entries_since(since, limit):
+            yield (',' if count else '') + json.dumps({
+                'seq': entry.seq,
+                'type': entry.object_type,
+                'id': entry.object_id,
+                'action': entry.action,
+                'data': entry.data,
+            })
+            last, count = entry.seq, count + 1
+        yield '], "next_since": %d, "has_more": %s}' % (last, json.dumps(count >= limit))
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
\ No newline at end of file